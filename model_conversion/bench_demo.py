@@ -0,0 +1,622 @@
+"""
+Micro-benchmarks for the demo.py pipeline helpers.
+
+Each subcommand times an optimized path against the reference implementation in demo.py
+and checks that both produce the same result.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+import cv2
+import numpy as np
+
+from demo import (
+    DETECTION_DTYPE,
+    FallbackPolicy,
+    JPEG_EXTS,
+    UltraTinyODDecoder,
+    batched_nms,
+    compare_benchmarks,
+    decode_floor,
+    find_baseline,
+    imread_for_model,
+    load_session,
+    nms,
+    parse_model_spec,
+    parse_size,
+    postprocess,
+    preprocess,
+    preprocess_into,
+    run_and_decode,
+    select_detections,
+)
+from serve import MicroBatcher, ServeModels, UnixHTTPServer, make_serve_handler
+from session_pool import SessionPool
+
+
+def time_call(fn: Callable[[], object], iters: int, warmup: int = 5) -> Tuple[float, float]:
+    """Return (mean_ms, p50_ms) over `iters` calls after `warmup` untimed calls."""
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(iters, dtype=np.float64)
+    for i in range(iters):
+        t0 = time.perf_counter()
+        fn()
+        samples[i] = (time.perf_counter() - t0) * 1000.0
+    return float(samples.mean()), float(np.median(samples))
+
+
+def parse_resolutions(arg: str) -> List[Tuple[int, int]]:
+    """'480x640,1080x1920' -> [(480, 640), (1080, 1920)] as HxW."""
+    return [parse_size(tok) for tok in arg.split(",") if tok.strip()]
+
+
+def bench_preprocess(args) -> int:
+    img_size = parse_size(args.img_size)
+    rng = np.random.default_rng(0)
+    out = np.empty((1, 3, img_size[0], img_size[1]), dtype=np.float32)
+    scratch = np.empty((img_size[0], img_size[1], 3), dtype=np.uint8)
+
+    print("=" * 70)
+    print(f"preprocess vs preprocess_into (target {img_size[0]}x{img_size[1]}, {args.iters} iters)")
+    print("=" * 70)
+    print(f"{'source':>11} | {'ref mean':>9} {'ref p50':>9} | {'fused mean':>10} {'fused p50':>9} | {'speedup':>7} | max|diff|  (ms)")
+    ok = True
+    for h, w in parse_resolutions(args.resolutions):
+        img = rng.integers(0, 256, size=(h, w, 3), dtype=np.uint8)
+        ref = preprocess(img, img_size)
+        preprocess_into(img, img_size, out, scratch)
+        max_diff = float(np.max(np.abs(ref - out)))
+        ok &= bool(np.array_equal(ref, out))
+
+        ref_mean, ref_p50 = time_call(lambda: preprocess(img, img_size), args.iters)
+        fused_mean, fused_p50 = time_call(lambda: preprocess_into(img, img_size, out, scratch), args.iters)
+        print(
+            f"{h:>5}x{w:<5} | {ref_mean:9.3f} {ref_p50:9.3f} | {fused_mean:10.3f} {fused_p50:9.3f} | "
+            f"{ref_mean / fused_mean:6.2f}x | {max_diff:.3g}"
+        )
+    print("equivalence:", "OK (bit-identical)" if ok else "MISMATCH")
+    return 0 if ok else 1
+
+
+def bench_jpeg_decode(args) -> int:
+    img_size = parse_size(args.img_size)
+    paths = sorted(p for p in Path(args.images).rglob("*") if p.suffix.lower() in JPEG_EXTS)[: args.limit]
+    if not paths:
+        print(f"No JPEG files found under {args.images}")
+        return 1
+    full = np.empty((1, 3, img_size[0], img_size[1]), dtype=np.float32)
+    reduced = np.empty_like(full)
+
+    def _full(p) -> bool:
+        img = cv2.imread(str(p), cv2.IMREAD_COLOR)
+        if img is None:
+            return False
+        preprocess_into(img, img_size, full)
+        return True
+
+    def _reduced(p) -> bool:
+        img = imread_for_model(p, img_size, reduced_decode=True)[0]
+        if img is None:
+            return False
+        preprocess_into(img, img_size, reduced)
+        return True
+
+    # warm the page cache so both paths measure decode, not disk
+    for p in paths:
+        p.read_bytes()
+
+    t_full, t_reduced, diffs = [], [], []
+    skipped = 0
+    for p in paths:
+        t0 = time.perf_counter()
+        ok = _full(p)
+        t1 = time.perf_counter()
+        # unreadable files are skipped like the main pipeline does; both paths must decode to compare
+        if not ok or not _reduced(p):
+            print(f"Skip unreadable file: {p}")
+            skipped += 1
+            continue
+        t2 = time.perf_counter()
+        t_full.append((t1 - t0) * 1000.0)
+        t_reduced.append((t2 - t1) * 1000.0)
+        diffs.append(float(np.mean(np.abs(full - reduced))))
+    if not t_full:
+        print(f"No readable JPEG files under {args.images} ({skipped} skipped)")
+        return 1
+    t_full, t_reduced, diffs = np.asarray(t_full), np.asarray(t_reduced), np.asarray(diffs)
+
+    print("=" * 70)
+    print(
+        f"Full vs reduced JPEG decode + preprocess ({len(t_full)} files, {skipped} unreadable skipped, "
+        f"target {img_size[0]}x{img_size[1]})"
+    )
+    print("=" * 70)
+    print(f"full    : mean {t_full.mean():8.3f} ms  p50 {np.median(t_full):8.3f} ms  total {t_full.sum() / 1000.0:7.2f} s")
+    print(f"reduced : mean {t_reduced.mean():8.3f} ms  p50 {np.median(t_reduced):8.3f} ms  total {t_reduced.sum() / 1000.0:7.2f} s")
+    print(f"speedup : {t_full.sum() / t_reduced.sum():.2f}x")
+    print(f"input tensor mean|diff| : mean {diffs.mean():.4f}  max {diffs.max():.4f}  (pixel scale 0..1)")
+    return 0
+
+
+def synthetic_raw_map(
+    rng: np.random.Generator, batch: int, anchors: int, classes: int, grid: int, occupancy: float, quality: bool = True
+) -> np.ndarray:
+    """Raw [B, A*(5+q+C), G, G] logits where roughly `occupancy` of the anchor-cells hold an object."""
+    per_anchor = 5 + int(quality) + classes
+    raw = rng.standard_normal((batch, anchors, per_anchor, grid, grid)).astype(np.float32)
+    obj = rng.normal(-8.0, 2.0, size=(batch, anchors, grid, grid))
+    hot = rng.random((batch, anchors, grid, grid)) < occupancy
+    obj[hot] = rng.normal(3.0, 1.0, size=int(hot.sum()))
+    raw[:, :, 4] = obj
+    if quality:
+        raw[:, :, 5] = rng.normal(2.0, 1.0, size=(batch, anchors, grid, grid))
+    return raw.reshape(batch, anchors * per_anchor, grid, grid)
+
+
+def check_sparse_equivalence(decoder: UltraTinyODDecoder, raw: np.ndarray, conf_floor: float) -> bool:
+    """Sparse output must equal the dense output filtered at conf_floor (same rows, same order)."""
+    dense = decoder.decode(raw)
+    sparse = decoder.decode(raw, conf_floor)
+    for d, s in zip(dense, sparse):
+        d = d[d[:, 0] >= conf_floor] if conf_floor > 0.0 else d
+        if d.shape != s.shape or not np.array_equal(d, s):
+            return False
+    return len(dense) == len(sparse)
+
+
+def bench_decode(args) -> int:
+    rng = np.random.default_rng(0)
+    anchors = np.stack([np.linspace(0.08, 0.32, args.anchors), np.linspace(0.10, 0.40, args.anchors)], axis=1).astype(np.float32)
+    wh_scale = np.ones_like(anchors)
+    decoder = UltraTinyODDecoder(anchors, has_quality=True, wh_scale=wh_scale)
+    conf_floor = decode_floor(args.conf_thresh)
+
+    # equivalence over a spread of seeds, occupancies and floors (including the 0.0 edge case)
+    ok = True
+    for occ in (0.0, 0.01, 0.1, 0.5, 1.0):
+        for floor in (0.0, 0.05, conf_floor, 0.9):
+            for _ in range(5):
+                raw = synthetic_raw_map(rng, args.batch, args.anchors, args.classes, args.grid, occ)
+                ok &= check_sparse_equivalence(decoder, raw, floor)
+
+    print("=" * 70)
+    print(
+        f"Dense vs sparse decode (B={args.batch}, A={args.anchors}, C={args.classes}, grid={args.grid}, "
+        f"floor={conf_floor:.3f}, {args.iters} iters)"
+    )
+    print("=" * 70)
+    print(f"{'occupancy':>9} | {'dense mean':>10} {'dense p50':>9} | {'sparse mean':>11} {'sparse p50':>10} | speedup  (ms)")
+    for occ in (0.001, 0.01, 0.05, 0.2):
+        raw = synthetic_raw_map(rng, args.batch, args.anchors, args.classes, args.grid, occ)
+        d_mean, d_p50 = time_call(lambda: decoder.decode(raw), args.iters)
+        s_mean, s_p50 = time_call(lambda: decoder.decode(raw, conf_floor), args.iters)
+        print(f"{occ:>9.3f} | {d_mean:10.4f} {d_p50:9.4f} | {s_mean:11.4f} {s_p50:10.4f} | {d_mean / s_mean:6.2f}x")
+    print("equivalence:", "OK (sparse == dense filtered at floor)" if ok else "MISMATCH")
+    return 0 if ok else 1
+
+
+def synthetic_boxes(rng: np.random.Generator, n: int, classes: int, clusters: int) -> np.ndarray:
+    """`n` jittered boxes scattered around `clusters` centers in a 64x64 frame, as a DETECTION_DTYPE array."""
+    boxes = np.empty(n, dtype=DETECTION_DTYPE)
+    centers = rng.uniform(8.0, 56.0, size=(max(clusters, 1), 2))
+    idx = rng.integers(0, len(centers), size=n)
+    cxy = centers[idx] + rng.normal(0.0, 2.0, size=(n, 2))
+    wh = rng.uniform(4.0, 16.0, size=(n, 2))
+    boxes["score"] = rng.random(n)
+    boxes["cls"] = rng.integers(0, classes, size=n)
+    boxes["x1"], boxes["y1"] = (cxy - wh / 2).T
+    boxes["x2"], boxes["y2"] = (cxy + wh / 2).T
+    return boxes
+
+
+def reference_nms(boxes: np.ndarray, iou_thresh: float, class_aware: bool, max_det: int) -> np.ndarray:
+    """Textbook pure-Python greedy NMS used as the correctness oracle."""
+    order = sorted(range(len(boxes)), key=lambda i: -float(boxes["score"][i]))
+    keep: List[int] = []
+    for i in order:
+        if len(keep) >= max_det:
+            break
+        bi = boxes[i]
+        area_i = (float(bi["x2"]) - float(bi["x1"])) * (float(bi["y2"]) - float(bi["y1"]))
+        suppressed = False
+        for j in keep:
+            bj = boxes[j]
+            if class_aware and int(bi["cls"]) != int(bj["cls"]):
+                continue
+            iw = min(float(bi["x2"]), float(bj["x2"])) - max(float(bi["x1"]), float(bj["x1"]))
+            ih = min(float(bi["y2"]), float(bj["y2"])) - max(float(bi["y1"]), float(bj["y1"]))
+            inter = max(iw, 0.0) * max(ih, 0.0)
+            area_j = (float(bj["x2"]) - float(bj["x1"])) * (float(bj["y2"]) - float(bj["y1"]))
+            if inter / max(area_i + area_j - inter, 1e-12) > iou_thresh:
+                suppressed = True
+                break
+        if not suppressed:
+            keep.append(i)
+    return boxes[keep]
+
+
+def bench_nms(args) -> int:
+    rng = np.random.default_rng(0)
+    counts = [int(tok) for tok in args.counts.split(",") if tok.strip()]
+
+    # correctness against the pure-Python oracle (small n only; it is quadratic in Python)
+    ok = True
+    for n in (0, 1, 2, 10, 50, 200):
+        for class_aware in (True, False):
+            boxes = synthetic_boxes(rng, n, args.classes, clusters=max(n // 10, 1))
+            ok &= bool(np.array_equal(nms(boxes, args.iou, class_aware, args.max_det), reference_nms(boxes, args.iou, class_aware, args.max_det)))
+
+    # batched NMS must match per-image NMS image by image
+    batch = [synthetic_boxes(rng, int(n), args.classes, clusters=8) for n in rng.integers(0, 300, size=args.batch)]
+    for class_aware in (True, False):
+        batched = batched_nms(batch, args.iou, class_aware, args.max_det)
+        looped = [nms(b, args.iou, class_aware, args.max_det) for b in batch]
+        ok &= all(np.array_equal(a, b) for a, b in zip(batched, looped))
+
+    print("=" * 70)
+    print(f"Vectorized NMS (classes={args.classes}, iou={args.iou}, max_det={args.max_det}, {args.iters} iters)")
+    print("=" * 70)
+    print(f"{'candidates':>10} | {'vec mean':>9} {'vec p50':>9} | {'py mean':>9} | speedup  (ms)")
+    for n in counts:
+        boxes = synthetic_boxes(rng, n, args.classes, clusters=max(n // 20, 1))
+        v_mean, v_p50 = time_call(lambda: nms(boxes, args.iou, True, args.max_det), args.iters)
+        if n <= args.reference_limit:
+            r_mean, _ = time_call(lambda: reference_nms(boxes, args.iou, True, args.max_det), max(args.iters // 20, 1), warmup=1)
+            print(f"{n:>10} | {v_mean:9.4f} {v_p50:9.4f} | {r_mean:9.4f} | {r_mean / v_mean:6.2f}x")
+        else:
+            print(f"{n:>10} | {v_mean:9.4f} {v_p50:9.4f} | {'-':>9} |")
+
+    b_mean, _ = time_call(lambda: batched_nms(batch, args.iou, True, args.max_det), args.iters)
+    l_mean, _ = time_call(lambda: [nms(b, args.iou, True, args.max_det) for b in batch], args.iters)
+    print(f"batched ({args.batch} images): {b_mean:.4f} ms  vs per-image loop: {l_mean:.4f} ms  ({l_mean / b_mean:.2f}x)")
+    print("equivalence:", "OK (matches reference and per-image NMS)" if ok else "MISMATCH")
+    return 0 if ok else 1
+
+
+def double_pass_select(dets: np.ndarray, target_hw: Tuple[int, int], conf_thresh: float) -> np.ndarray:
+    """The previous two-pass fallback: postprocess again at max(0.05, conf * 0.5) when nothing passes."""
+    boxes = postprocess(dets, target_hw, conf_thresh)
+    if len(boxes) == 0 and dets.size > 0 and conf_thresh > 0.05:
+        boxes = postprocess(dets, target_hw, max(0.05, conf_thresh * 0.5))
+    return boxes
+
+
+def bench_select(args) -> int:
+    rng = np.random.default_rng(0)
+    target_hw = (480, 640)
+
+    def _dets(n: int, hi: float) -> np.ndarray:
+        # decoder output order: best first
+        d = np.empty((n, 6), dtype=np.float32)
+        d[:, 0] = -np.sort(-rng.uniform(0.0, hi, n))
+        d[:, 1] = rng.integers(0, 3, n)
+        d[:, 2:4] = rng.uniform(0.0, 1.0, (n, 2))
+        d[:, 4:6] = rng.uniform(0.01, 0.3, (n, 2))
+        return d
+
+    # same boxes as the two-pass path (order aside: the single pass returns them best first)
+    ok = True
+    for hi in (0.1, 0.2, 0.5, 1.0):
+        for n in (0, 1, 10, 500):
+            d = _dets(n, hi)
+            ref = double_pass_select(d, target_hw, args.conf_thresh)
+            got, _ = select_detections(d, target_hw, args.conf_thresh)
+            ok &= bool(np.array_equal(np.sort(ref, order=["score", "x1", "y1"]), np.sort(got, order=["score", "x1", "y1"])))
+
+    # a sparse decode is the dense rows cut at decode_floor; boxes and fallback reports must not change
+    for policy in (FallbackPolicy("thresh"), FallbackPolicy("topk", min_k=3), FallbackPolicy("none")):
+        floor = decode_floor(args.conf_thresh, policy)
+        for hi in (0.01, 0.1, 0.2, 0.5, 1.0):
+            for n in (0, 1, 10, 500):
+                d = _dets(n, hi)
+                dense = select_detections(d, target_hw, args.conf_thresh, fallback=policy)
+                sparse = select_detections(d[d[:, 0] >= floor], target_hw, args.conf_thresh, fallback=policy)
+                ok &= bool(np.array_equal(dense[0], sparse[0])) and dense[1] == sparse[1]
+
+    print("=" * 70)
+    print(f"Two-pass postprocess fallback vs single-pass select_detections (conf={args.conf_thresh}, {args.iters} iters)")
+    print("=" * 70)
+    print(f"{'scene':>10} {'cands':>6} | {'2-pass mean':>11} | {'1-pass mean':>11} | speedup  (ms)")
+    for scene, hi in (("empty", args.conf_thresh * 0.9), ("busy", 1.0)):
+        for n in (args.candidates // 10, args.candidates):
+            d = _dets(n, hi)
+            r_mean, _ = time_call(lambda: double_pass_select(d, target_hw, args.conf_thresh), args.iters)
+            s_mean, _ = time_call(lambda: select_detections(d, target_hw, args.conf_thresh), args.iters)
+            print(f"{scene:>10} {n:>6} | {r_mean:11.4f} | {s_mean:11.4f} | {r_mean / s_mean:6.2f}x")
+    print("equivalence:", "OK (same boxes as the two-pass fallback; dense == sparse boxes and reports)" if ok else "MISMATCH")
+    return 0 if ok else 1
+
+
+def bench_compare(args) -> int:
+    run = json.loads(Path(args.run).read_text(encoding="utf-8"))
+    if args.baseline == "latest":
+        if not args.history:
+            print("'latest' needs --history")
+            return 2
+        baseline_path = find_baseline(Path(args.history), run, exclude=Path(args.run))
+        if baseline_path is None:
+            print(f"No matching baseline for {args.run} in {args.history}")
+            return 2
+    else:
+        baseline_path = Path(args.baseline)
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    stages = [s for s in args.stages.split(",") if s] if args.stages else None
+    lines, ok = compare_benchmarks(
+        run, baseline, args.max_latency_regress, args.max_fps_drop, args.percentile, stages, args.min_delta_ms
+    )
+
+    print("=" * 70)
+    print(f"{args.run}  vs  baseline {baseline_path}")
+    for label, rec in (("run", run), ("baseline", baseline)):
+        host = rec.get("host", {})
+        print(f"  {label:<8}: {rec.get('variant')} b{rec.get('batch_size')} {rec.get('created')} | {host.get('cpu_model')} | threads {rec.get('threads')}")
+    print("=" * 70)
+    for line in lines:
+        print(line)
+    print("gate:", "OK" if ok else "REGRESSION")
+    return 0 if ok else 1
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str) -> None:
+        super().__init__("localhost")
+        self._path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self._path)
+
+
+def _serve_payloads(args) -> List[bytes]:
+    if args.images:
+        files = sorted(p for p in Path(args.images).rglob("*") if p.suffix.lower() in JPEG_EXTS)[: args.frames]
+        payloads = [p.read_bytes() for p in files]
+        if not payloads:
+            raise SystemExit(f"No JPEG files under {args.images}")
+        return payloads
+    rng = np.random.default_rng(0)
+    h, w = parse_size(args.resolution)
+    return [cv2.imencode(".jpg", rng.integers(0, 256, (h, w, 3), dtype=np.uint8))[1].tobytes() for _ in range(args.frames)]
+
+
+def _serve_load(connect: Callable[[], http.client.HTTPConnection], payloads: List[bytes], concurrency: int, requests: int):
+    """Fire `requests` POST /detect from `concurrency` keep-alive clients; returns (seconds, latencies_ms, responses)."""
+    latencies = np.zeros(requests, dtype=np.float64)
+    responses: List[object] = [None] * requests
+    errors: List[str] = []
+
+    def _client(worker: int) -> None:
+        conn = connect()
+        try:
+            for i in range(worker, requests, concurrency):
+                t0 = time.perf_counter()
+                conn.request("POST", "/detect", body=payloads[i % len(payloads)], headers={"Content-Type": "image/jpeg"})
+                resp = conn.getresponse()
+                body = resp.read()
+                latencies[i] = (time.perf_counter() - t0) * 1000.0
+                if resp.status != 200:
+                    errors.append(f"HTTP {resp.status}: {body[:200]!r}")
+                    return
+                responses[i] = json.loads(body)["detections"]
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=_client, args=(w,)) for w in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    if errors:
+        raise RuntimeError(errors[0])
+    return elapsed, latencies, responses
+
+
+def bench_serve(args) -> int:
+    img_size = parse_size(args.img_size)
+    session, session_info = load_session(args.onnx, img_size)
+    payloads = _serve_payloads(args)
+    configs = (("batch 1", 1, 0.0), (f"micro-batch {args.max_batch}", args.max_batch, args.max_delay_ms))
+
+    print("=" * 70)
+    transport = "unix socket" if args.unix else "localhost TCP"
+    print(f"Serve mode over {transport}: {args.requests} requests, {args.concurrency} concurrent clients, {len(payloads)} images")
+    print("=" * 70)
+    print(f"{'scheduler':>18} | {'req/s':>8} | {'p50 ms':>8} | {'p95 ms':>8} | {'mean batch':>10}")
+    results = []
+    for label, max_batch, delay in configs:
+        batcher = MicroBatcher(session, session_info, img_size, max_batch, delay, max_queue=4 * args.concurrency)
+        handler = make_serve_handler(ServeModels("default", batcher=batcher), args.conf_thresh)
+        if args.unix:
+            sock_path = str(Path(tempfile.mkdtemp(prefix="uhd-serve-")) / "uhd.sock")
+            server = UnixHTTPServer(sock_path, handler)
+            connect = lambda: _UnixHTTPConnection(sock_path)
+        else:
+            server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+            server.daemon_threads = True
+            port = server.server_address[1]
+            connect = lambda: http.client.HTTPConnection("127.0.0.1", port)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            _serve_load(connect, payloads, args.concurrency, min(args.requests, 4 * args.concurrency))
+            elapsed, lat, responses = _serve_load(connect, payloads, args.concurrency, args.requests)
+            stats = batcher.stats()
+        finally:
+            server.shutdown()
+            server.server_close()
+            batcher.close()
+        # mean batch includes the short warm-up round
+        print(
+            f"{label:>18} | {args.requests / elapsed:8.1f} | {np.percentile(lat, 50):8.3f} | "
+            f"{np.percentile(lat, 95):8.3f} | {stats['mean_batch']:10.2f}"
+        )
+        results.append(responses)
+
+    # batching must not change answers (ORT may differ in the last bits across batch sizes)
+    ok = True
+    for a, b in zip(*results):
+        a, b = np.asarray(a, dtype=np.float64).reshape(-1, 6), np.asarray(b, dtype=np.float64).reshape(-1, 6)
+        ok &= a.shape == b.shape and bool(np.allclose(a, b, atol=1e-3))
+    print("equivalence:", "OK (same detections as batch 1)" if ok else "MISMATCH")
+    return 0 if ok else 1
+
+
+def bench_pool(args) -> int:
+    img_size = parse_size(args.img_size)
+    specs = [parse_model_spec(spec, img_size) for spec in args.model]
+    if len(specs) < 2:
+        print("Give at least two --model NAME=PATH[@HxW] to switch between")
+        return 2
+    inputs = {name: np.random.default_rng(0).random((1, 3, *size), dtype=np.float32) for name, _, size in specs}
+
+    def _cold(name: str, path: str, size: Tuple[int, int]) -> float:
+        # what each service pays today: load the model, then its first run
+        t0 = time.perf_counter()
+        session, session_info = load_session(path, size)
+        run_and_decode(session, session_info, inputs[name], args.conf_thresh)
+        return (time.perf_counter() - t0) * 1000.0
+
+    def _switching(pool: SessionPool) -> Tuple[np.ndarray, dict]:
+        # round-robin requests across the models, each a pool lookup plus one run
+        samples = np.empty(args.requests, dtype=np.float64)
+        for i in range(args.requests):
+            name = specs[i % len(specs)][0]
+            t0 = time.perf_counter()
+            session, session_info = pool.get(name)
+            run_and_decode(session, session_info, inputs[name], args.conf_thresh)
+            samples[i] = (time.perf_counter() - t0) * 1000.0
+        return samples, pool.stats()
+
+    cold = [_cold(*spec) for spec in specs]
+    roomy = SessionPool(1 << 40)
+    tight = SessionPool(1)
+    for pool in (roomy, tight):
+        for name, path, size in specs:
+            pool.register(name, path, size)
+    roomy.preload()
+    warm, warm_stats = _switching(roomy)
+    thrash, thrash_stats = _switching(tight)
+
+    # loading the models in sequence must evict down to the budget (or to the one just requested);
+    # a model is charged at least its file size, so a budget below their sum has to evict
+    ok = True
+    for budget in (1, sum(os.path.getsize(path) for _, path, _ in specs) - 1, 1 << 40):
+        pool = SessionPool(budget)
+        for name, path, size in specs:
+            pool.register(name, path, size)
+        for name, _, _ in specs * 2:
+            pool.get(name)
+            ok &= pool.loaded_bytes() <= budget or pool.loaded() == [name]
+        st = pool.stats()
+        ok &= st["evictions"] == st["loads"] - len(st["loaded"])
+        ok &= (st["evictions"] == 0) if budget == 1 << 40 else st["evictions"] > 0
+
+    print("=" * 70)
+    print(f"Switching between {len(specs)} models: cold load vs warm session pool ({args.requests} requests)")
+    print("=" * 70)
+    for (name, _, _), ms in zip(specs, cold):
+        print(f"  cold load + first run  {name:<20} {ms:9.2f} ms")
+    for label, samples, st in (("pool, all resident", warm, warm_stats), ("pool, budget of one", thrash, thrash_stats)):
+        print(
+            f"  {label:<22} mean {samples.mean():8.3f} ms  p95 {np.percentile(samples, 95):8.3f} ms  "
+            f"({st['loads']} loads, {st['evictions']} evictions, {st['loaded_mb']:.1f} MB resident)"
+        )
+    print("eviction:", "OK (resident models stay within each budget)" if ok else "MISMATCH")
+    return 0 if ok else 1
+
+
+def build_args():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for demo.py pipeline helpers.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("preprocess", help="Reference preprocess() vs fused preprocess_into().")
+    p.add_argument("--img-size", type=str, default="64x64", help="Model input size HxW.")
+    p.add_argument("--resolutions", type=str, default="240x320,480x640,720x1280,1080x1920", help="Source sizes HxW.")
+    p.add_argument("--iters", type=int, default=200, help="Timed iterations per resolution.")
+    p.set_defaults(func=bench_preprocess)
+
+    p = sub.add_parser("jpeg-decode", help="Full-resolution vs reduced-resolution JPEG decode on a local corpus.")
+    p.add_argument("--images", required=True, type=str, help="Directory searched recursively for JPEG files.")
+    p.add_argument("--img-size", type=str, default="64x64", help="Model input size HxW.")
+    p.add_argument("--limit", type=int, default=500, help="Maximum number of files to measure.")
+    p.set_defaults(func=bench_jpeg_decode)
+
+    p = sub.add_parser("decode", help="Dense reference decoder vs threshold-first sparse decoder.")
+    p.add_argument("--batch", type=int, default=1, help="Batch size of the synthetic raw map.")
+    p.add_argument("--anchors", type=int, default=8, help="Anchors per cell.")
+    p.add_argument("--classes", type=int, default=1, help="Number of classes.")
+    p.add_argument("--grid", type=int, default=8, help="Output map size (HxW = grid x grid).")
+    p.add_argument("--conf-thresh", type=float, default=0.30, help="Confidence threshold (floor derived as in demo.py).")
+    p.add_argument("--iters", type=int, default=500, help="Timed iterations per occupancy.")
+    p.set_defaults(func=bench_decode)
+
+    p = sub.add_parser("nms", help="Vectorized / batched NMS vs a pure-Python reference.")
+    p.add_argument("--counts", type=str, default="10,100,1000,10000", help="Candidate counts to time.")
+    p.add_argument("--classes", type=int, default=3, help="Number of classes in the synthetic boxes.")
+    p.add_argument("--iou", type=float, default=0.45, help="IoU threshold.")
+    p.add_argument("--max-det", type=int, default=100, help="Maximum detections kept.")
+    p.add_argument("--batch", type=int, default=16, help="Images in the batched-NMS comparison.")
+    p.add_argument("--reference-limit", type=int, default=1000, help="Largest count timed with the Python reference.")
+    p.add_argument("--iters", type=int, default=100, help="Timed iterations per count.")
+    p.set_defaults(func=bench_nms)
+
+    p = sub.add_parser("select", help="Two-pass postprocess fallback vs single-pass select_detections.")
+    p.add_argument("--conf-thresh", type=float, default=0.30, help="Primary confidence threshold.")
+    p.add_argument("--candidates", type=int, default=5000, help="Decoded candidates per frame (largest size).")
+    p.add_argument("--iters", type=int, default=500, help="Timed iterations per scene.")
+    p.set_defaults(func=bench_select)
+
+    p = sub.add_parser("compare", help="Gate a stored demo.py --benchmark record against a baseline record.")
+    p.add_argument("run", type=str, help="Benchmark JSON to check.")
+    p.add_argument("baseline", type=str, help="Baseline JSON, or 'latest' for the newest matching record in --history.")
+    p.add_argument("--history", type=str, default=None, help="Benchmark history directory (for 'latest').")
+    p.add_argument("--percentile", choices=("p50", "p95", "p99", "mean"), default="p95", help="Latency statistic compared.")
+    p.add_argument("--max-latency-regress", type=float, default=10.0, help="Allowed latency increase in percent.")
+    p.add_argument("--max-fps-drop", type=float, default=10.0, help="Allowed FPS drop in percent.")
+    p.add_argument("--min-delta-ms", type=float, default=0.05, help="Latency changes below this are treated as noise.")
+    p.add_argument("--stages", type=str, default=None, help="Comma-separated stages to gate (default: all).")
+    p.set_defaults(func=bench_compare)
+
+    p = sub.add_parser("serve", help="demo.py --serve at batch 1 vs dynamic micro-batching under concurrent load.")
+    p.add_argument("--onnx", required=True, type=str, help="Model to serve.")
+    p.add_argument("--img-size", type=str, default="64x64", help="Model input size HxW.")
+    p.add_argument("--images", type=str, default=None, help="Directory of JPEGs to send (default: synthetic frames).")
+    p.add_argument("--resolution", type=str, default="480x640", help="Synthetic frame size HxW.")
+    p.add_argument("--frames", type=int, default=32, help="Distinct images cycled through.")
+    p.add_argument("--requests", type=int, default=1000, help="Timed requests per scheduler.")
+    p.add_argument("--concurrency", type=int, default=16, help="Concurrent keep-alive clients.")
+    p.add_argument("--max-batch", type=int, default=8, help="Micro-batching: most requests per session run.")
+    p.add_argument("--max-delay-ms", type=float, default=2.0, help="Micro-batching: longest wait for a batch to fill.")
+    p.add_argument("--conf-thresh", type=float, default=0.30, help="Confidence threshold.")
+    p.add_argument("--unix", action="store_true", help="Serve over a Unix socket instead of localhost TCP.")
+    p.set_defaults(func=bench_serve)
+
+    p = sub.add_parser("pool", help="Cold model loads vs a warm SessionPool when switching between models.")
+    p.add_argument("--model", action="append", default=[], metavar="NAME=PATH[@HxW]", help="Model to switch between (repeat).")
+    p.add_argument("--img-size", type=str, default="64x64", help="Default model input size HxW.")
+    p.add_argument("--requests", type=int, default=200, help="Round-robin requests per pool configuration.")
+    p.add_argument("--conf-thresh", type=float, default=0.30, help="Confidence threshold.")
+    p.set_defaults(func=bench_pool)
+    return parser
+
+
+def main() -> int:
+    args = build_args().parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,11 +3,14 @@ ONNX to ESP-DL format converter using ESP-PPQ
 """
 import argparse
 from pathlib import Path
+import numpy as np
 import torch
 import esp_ppq
 from esp_ppq import QuantizationSettingFactory, TargetPlatform
 from esp_ppq.api import quantize_onnx_model, export_ppq_graph
 
+from frame_store import FrameStore
+
 
 def create_dummy_dataloader(input_shape, num_samples=32, batch_size=1):
     """Create dummy calibration data loader"""
@@ -24,11 +27,34 @@ def create_dummy_dataloader(input_shape, num_samples=32, batch_size=1):
     return data
 
 
+def create_store_dataloader(store_path, input_shape, num_samples=32):
+    """Create calibration data from a frame store (frame_store.py): about num_samples frames, in
+    batches of input_shape[0], evenly spaced over the store"""
+    store = FrameStore(store_path)
+    n, _, h, w = input_shape
+    if tuple(store.img_size) != (h, w):
+        raise ValueError(f"Frame store holds {store.img_size[0]}x{store.img_size[1]} frames, model input is {h}x{w}")
+    if len(store) < n:
+        raise ValueError(f"Frame store has {len(store)} frames, one batch needs {n}: {store_path}")
+    num_batches = min(max(1, num_samples // n), len(store) - n + 1)
+    print(f"  Loading calibration data from {store_path}: {num_batches} batches of {n} from {len(store)} frames...")
+    
+    # Same [0, 1] RGB NCHW tensors as demo.py feeds the ONNX model; each batch is a zero-copy slice
+    starts = np.linspace(0, len(store) - n, num_batches).round().astype(np.int64)
+    data = []
+    for i in starts:
+        sample = torch.from_numpy(store.model_input(slice(i, i + n)))
+        data.append([sample])
+    
+    return data
+
+
 def convert_onnx_to_espdl(
     onnx_path: str,
     output_path: str,
     input_shape: tuple = (1, 3, 64, 64),
-    calibration_data=None
+    calibration_data=None,
+    calib_steps: int = 32
 ):
     """
     Convert ONNX model to ESP-DL format (.espdl)
@@ -38,6 +64,7 @@ def convert_onnx_to_espdl(
         output_path: Path for output .espdl file (without extension)
         input_shape: Model input shape (batch, channels, height, width)
         calibration_data: Optional calibration data for quantization
+        calib_steps: Calibration steps over calibration_data (default: 32)
     """
     print(f"\n{'='*60}")
     print(f"ONNX to ESP-DL Converter")
@@ -56,8 +83,6 @@ def convert_onnx_to_espdl(
         print("Step 2: Creating calibration data...")
         calibration_data = create_dummy_dataloader(input_shape, num_samples=32)
         calib_steps = 32
-    else:
-        calib_steps = 32
     
     # Quantize the model
     print("Step 3: Quantizing model...")
@@ -123,6 +148,12 @@ Example usage:
     --output model_conversion\\esp_dl\\uhd_t_w96_relu \\
     --input-shape 1,3,64,64
 
+  # Calibrate on real frames packed with frame_store.py
+  python model_conversion\\convert_to_espdl.py \\
+    --model model_conversion\\onnx\\uhd_relu_w64_single.onnx \\
+    --output model_conversion\\esp_dl\\uhd_n_w64_relu \\
+    --calib-store stores\\val64
+
 Note: Input model should be the single-output model created by create_single_output_model.py
         """
     )
@@ -145,6 +176,18 @@ Note: Input model should be the single-output model created by create_single_out
         type=str,
         help="Input shape as N,C,H,W (default: 1,3,64,64 for UHD)"
     )
+    parser.add_argument(
+        "--calib-store",
+        default=None,
+        type=str,
+        help="Frame store directory (frame_store.py) used for calibration instead of random data"
+    )
+    parser.add_argument(
+        "--calib-samples",
+        default=32,
+        type=int,
+        help="Number of frames taken from --calib-store, rounded down to whole batches of N (default: 32)"
+    )
     
     args = parser.parse_args()
     
@@ -162,12 +205,25 @@ Note: Input model should be the single-output model created by create_single_out
         print(f"Error: Input file not found: {args.model}")
         return 1
     
+    # Load calibration data
+    calibration_data, calib_steps = None, 32
+    if args.calib_store:
+        try:
+            calibration_data = create_store_dataloader(args.calib_store, input_shape, args.calib_samples)
+            # one calibration step per batch, so every requested frame is seen
+            calib_steps = len(calibration_data)
+        except (OSError, ValueError) as e:
+            print(f"Error loading calibration store: {e}")
+            return 1
+    
     # Convert
     try:
         output_file = convert_onnx_to_espdl(
             onnx_path=args.model,
             output_path=args.output,
-            input_shape=input_shape
+            input_shape=input_shape,
+            calibration_data=calibration_data,
+            calib_steps=calib_steps
         )
         return 0 if output_file else 1
     except Exception as e:
@@ -1,10 +1,23 @@
 #!/usr/bin/env python3
 import argparse
+import hashlib
+import io
+import json
 import os
+import platform
+import queue
 import re
+import struct
+import sys
+import threading
 import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from itertools import chain, islice
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import AbstractSet, Iterable, Iterator, List, Optional, Tuple, Union
 
 import cv2
 import numpy as np
@@ -12,43 +25,391 @@ import onnxruntime as ort
 import onnx
 from onnx import numpy_helper
 
+from frame_store import FrameStore, frames_to_input, is_frame_store
+from image_index import ImageIndex, scan_image_entries, scan_images
+from prediction_cache import PredictionCache
+
+
+class TraceRecorder:
+    """
+    Python-side spans in Chrome-trace form ("X" events, wall-clock microseconds, OS thread ids), so they
+    line up with onnxruntime's own profile (which uses the same clock and thread ids) when merged.
+    """
+
+    def __init__(self) -> None:
+        self._events: List[dict] = []
+        self._threads: dict = {}
+        self._lock = threading.Lock()
+        self._epoch_ns = time.time_ns()
+        self._perf_ns = time.perf_counter_ns()
+
+    def _now_us(self) -> float:
+        # perf_counter resolution, anchored to the wall clock ORT reports its profiling start in
+        return (self._epoch_ns + time.perf_counter_ns() - self._perf_ns) / 1000.0
+
+    @contextmanager
+    def span(self, name: str, cat: str = "python"):
+        start = self._now_us()
+        try:
+            yield
+        finally:
+            end = self._now_us()
+            tid = threading.get_native_id()
+            event = {"name": name, "cat": cat, "ph": "X", "ts": start, "dur": end - start, "pid": os.getpid(), "tid": tid}
+            with self._lock:
+                self._events.append(event)
+                self._threads.setdefault(tid, threading.current_thread().name)
+
+    def events(self) -> List[dict]:
+        with self._lock:
+            meta = [
+                {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                for tid, name in self._threads.items()
+            ]
+            return meta + list(self._events)
+
+
+# Set by --profile; spans are free no-ops while it is None.
+_TRACER: Optional[TraceRecorder] = None
+_NO_SPAN = nullcontext()
+
+
+def _span(name: str, cat: str = "python"):
+    tracer = _TRACER
+    return tracer.span(name, cat) if tracer is not None else _NO_SPAN
+
+
+def _traced(name: str, cat: str = "python"):
+    """Decorator form of _span for functions that are one pipeline stage end to end."""
+
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _TRACER is None:
+                return fn(*args, **kwargs)
+            with _TRACER.span(name, cat):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return deco
+
 
 def preprocess(img_bgr: np.ndarray, img_size: Tuple[int, int]) -> np.ndarray:
     img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-    resized = cv2.resize(img_rgb, img_size, interpolation=cv2.INTER_LINEAR)
+    h, w = img_size
+    resized = cv2.resize(img_rgb, (w, h), interpolation=cv2.INTER_LINEAR)
     arr = resized.astype(np.float32) / 255.0
     chw = np.transpose(arr, (2, 0, 1))
     return chw[np.newaxis, ...]
 
 
-def postprocess(detections: np.ndarray, orig_shape: Tuple[int, int], conf_thresh: float) -> List[Tuple[float, int, float, float, float, float]]:
+def preprocess_into(
+    img_bgr: np.ndarray,
+    img_size: Tuple[int, int],
+    out: np.ndarray,
+    scratch: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Fused equivalent of preprocess() writing into a caller-supplied float32 [3, H, W] (or [1, 3, H, W]) buffer.
+    Resizes the BGR frame first, so the only full-resolution pass is the resize itself; the channel swap
+    and /255 normalization then run on the small image straight into `out`. `scratch` is an optional
+    uint8 [H, W, 3] buffer reused as the resize destination. Output is bit-identical to preprocess().
+    """
+    chw = out[0] if out.ndim == 4 else out
+    h, w = img_size
+    if scratch is not None:
+        resized = cv2.resize(img_bgr, (w, h), dst=scratch, interpolation=cv2.INTER_LINEAR)
+    else:
+        resized = cv2.resize(img_bgr, (w, h), interpolation=cv2.INTER_LINEAR)
+    # bilinear resize is per-channel, so resize-then-swap equals the reference swap-then-resize
+    for c in range(3):
+        np.divide(resized[:, :, 2 - c], np.float32(255.0), out=chw[c], dtype=np.float32)
+    return out
+
+
+# Compact per-frame detection record produced by postprocess and consumed by drawing/serialization.
+DETECTION_DTYPE = np.dtype(
+    [
+        ("score", np.float32),
+        ("cls", np.int32),
+        ("x1", np.float32),
+        ("y1", np.float32),
+        ("x2", np.float32),
+        ("y2", np.float32),
+    ]
+)
+
+
+def postprocess(detections: np.ndarray, orig_shape: Tuple[int, int], conf_thresh: float) -> np.ndarray:
+    """
+    Vectorized threshold + (cx, cy, w, h) -> clamped corner boxes in pixels of orig_shape.
+    Returns a DETECTION_DTYPE structured array; degenerate and non-finite boxes are dropped.
+    """
+    dets = np.asarray(detections)
+    if dets.ndim != 2 or dets.shape[0] == 0 or dets.shape[1] < 6:
+        return np.zeros(0, dtype=DETECTION_DTYPE)
+    return _corner_boxes(dets[dets[:, 0] >= conf_thresh], orig_shape)
+
+
+def _corner_boxes(dets: np.ndarray, orig_shape: Tuple[int, int]) -> np.ndarray:
+    """[N, 6] (score, cls, cx, cy, w, h) rows -> DETECTION_DTYPE corners, row order preserved."""
     h, w = orig_shape
-    out: List[Tuple[float, int, float, float, float, float]] = []
-    for det in detections:
-        if len(det) < 6:
-            continue
-        score, cls_id, cx, cy, bw, bh = det[:6]
-        if score < conf_thresh:
-            continue
-        x1 = (cx - bw / 2.0) * w
-        y1 = (cy - bh / 2.0) * h
-        x2 = (cx + bw / 2.0) * w
-        y2 = (cy + bh / 2.0) * h
-        # clamp to valid range to avoid NaN/inf impacting drawing
-        x1 = max(0.0, min(x1, w))
-        x2 = max(0.0, min(x2, w))
-        y1 = max(0.0, min(y1, h))
-        y2 = max(0.0, min(y2, h))
-        if x2 <= x1 or y2 <= y1:
-            continue
-        out.append((float(score), int(cls_id), float(x1), float(y1), float(x2), float(y2)))
+    score, cls_id, cx, cy, bw, bh = (dets[:, i] for i in range(6))
+    half_w = bw / 2.0
+    half_h = bh / 2.0
+    # clamp to valid range to avoid NaN/inf impacting drawing
+    x1 = np.clip((cx - half_w) * w, 0.0, w)
+    x2 = np.clip((cx + half_w) * w, 0.0, w)
+    y1 = np.clip((cy - half_h) * h, 0.0, h)
+    y2 = np.clip((cy + half_h) * h, 0.0, h)
+    keep = (x2 > x1) & (y2 > y1) & np.isfinite(score)
+    out = np.empty(int(keep.sum()), dtype=DETECTION_DTYPE)
+    out["score"] = score[keep]
+    out["cls"] = cls_id[keep]
+    out["x1"] = x1[keep]
+    out["y1"] = y1[keep]
+    out["x2"] = x2[keep]
+    out["y2"] = y2[keep]
+    return out
+
+
+def scale_boxes(boxes: np.ndarray, sx: float, sy: float) -> np.ndarray:
+    """Return a copy of DETECTION_DTYPE boxes with x scaled by sx and y by sy."""
+    out = boxes.copy()
+    out["x1"] *= sx
+    out["x2"] *= sx
+    out["y1"] *= sy
+    out["y2"] *= sy
     return out
 
 
-def draw_boxes(img_bgr: np.ndarray, boxes: List[Tuple[float, int, float, float, float, float]], color: Tuple[int, int, int]) -> np.ndarray:
+def _nms_keep(
+    boxes: np.ndarray,
+    group: Optional[np.ndarray],
+    iou_thresh: float,
+    max_det: Optional[int],
+) -> np.ndarray:
+    """
+    Greedy NMS over DETECTION_DTYPE boxes; returns kept indices in descending score order.
+    With `group`, a box only suppresses candidates that share its group id.
+    """
+    x1 = boxes["x1"].astype(np.float64)
+    y1 = boxes["y1"].astype(np.float64)
+    x2 = boxes["x2"].astype(np.float64)
+    y2 = boxes["y2"].astype(np.float64)
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-boxes["score"], kind="stable")
+    keep = []
+    while order.size > 0 and (max_det is None or len(keep) < max_det):
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        # IoU of the current best box against every remaining candidate in one shot
+        iw = np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])
+        ih = np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])
+        inter = np.clip(iw, 0.0, None) * np.clip(ih, 0.0, None)
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        suppress = iou > iou_thresh
+        if group is not None:
+            suppress &= group[rest] == group[i]
+        order = rest[~suppress]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def _nms_keep_padded(
+    boxes: np.ndarray,
+    valid: np.ndarray,
+    iou_thresh: float,
+    class_aware: bool,
+    max_det: Optional[int],
+) -> np.ndarray:
+    """
+    Greedy NMS for a padded [B, K] DETECTION_DTYPE batch, each row already sorted by descending score.
+    Every step keeps the best surviving candidate of each image and suppresses against it across the
+    whole batch at once, so the loop runs (max kept per image) times. Returns a [B, K] keep mask.
+    """
+    x1 = boxes["x1"].astype(np.float64)
+    y1 = boxes["y1"].astype(np.float64)
+    x2 = boxes["x2"].astype(np.float64)
+    y2 = boxes["y2"].astype(np.float64)
+    areas = (x2 - x1) * (y2 - y1)
+    removed = ~valid
+    keep = np.zeros(valid.shape, dtype=bool)
+    kept = np.zeros(valid.shape[0], dtype=np.int64)
+    rows = np.arange(valid.shape[0])
+    while True:
+        cand = ~removed
+        if max_det is not None:
+            cand &= (kept < max_det)[:, None]
+        live = cand.any(axis=1)
+        if not live.any():
+            break
+        b = rows[live]
+        r = cand[live].argmax(axis=1)
+        keep[b, r] = True
+        kept[b] += 1
+        removed[b, r] = True
+        iw = np.minimum(x2[b, r, None], x2[b]) - np.maximum(x1[b, r, None], x1[b])
+        ih = np.minimum(y2[b, r, None], y2[b]) - np.maximum(y1[b, r, None], y1[b])
+        inter = np.clip(iw, 0.0, None) * np.clip(ih, 0.0, None)
+        suppress = inter / np.maximum(areas[b, r, None] + areas[b] - inter, 1e-9) > iou_thresh
+        if class_aware:
+            suppress &= boxes["cls"][b] == boxes["cls"][b, r, None]
+        removed[b] |= suppress
+    return keep
+
+
+@_traced("nms")
+def nms(
+    boxes: np.ndarray,
+    iou_thresh: float = 0.45,
+    class_aware: bool = True,
+    max_det: Optional[int] = 100,
+) -> np.ndarray:
+    """
+    Non-maximum suppression over a DETECTION_DTYPE array (pixel corners).
+    class_aware only suppresses boxes of the same class. Returns at most max_det boxes, best first.
+    """
+    if len(boxes) == 0:
+        return boxes
+    keep = _nms_keep(boxes, boxes["cls"] if class_aware else None, iou_thresh, max_det)
+    return boxes[keep]
+
+
+@_traced("nms")
+def batched_nms(
+    boxes_list: List[np.ndarray],
+    iou_thresh: float = 0.45,
+    class_aware: bool = True,
+    max_det: Optional[int] = 100,
+) -> List[np.ndarray]:
+    """
+    NMS for many images in one pass: candidates are score-sorted into a padded [B, K] batch and
+    suppressed together. Equivalent to [nms(b, ...) for b in boxes_list].
+    """
+    counts = [len(b) for b in boxes_list]
+    k = max(counts, default=0)
+    if k == 0:
+        return [b[:0] for b in boxes_list]
+    padded = np.zeros((len(boxes_list), k), dtype=DETECTION_DTYPE)
+    valid = np.arange(k)[None, :] < np.asarray(counts)[:, None]
+    for i, b in enumerate(boxes_list):
+        padded[i, : len(b)] = b[np.argsort(-b["score"], kind="stable")]
+    keep = _nms_keep_padded(padded, valid, iou_thresh, class_aware, max_det)
+    return [padded[i][keep[i]] for i in range(len(boxes_list))]
+
+
+class FallbackPolicy:
+    """
+    What to keep when too few boxes pass conf_thresh.
+      thresh: if nothing passes, keep everything above the secondary threshold.
+      topk:   if fewer than min_k pass, top up to min_k with the best boxes above the secondary threshold.
+      none:   never fall back.
+    The secondary threshold defaults to max(0.05, conf_thresh * 0.5); a policy whose secondary threshold
+    is not below conf_thresh is inactive.
+    """
+
+    MODES = ("thresh", "topk", "none")
+
+    def __init__(self, mode: str = "thresh", thresh: Optional[float] = None, min_k: int = 1) -> None:
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown fallback mode: {mode} (choose from {', '.join(self.MODES)})")
+        self.mode = mode
+        self.thresh = thresh
+        self.min_k = max(1, int(min_k))
+
+    def secondary(self, conf_thresh: float) -> Optional[float]:
+        """Secondary threshold for conf_thresh, or None when the policy cannot fire."""
+        if self.mode == "none":
+            return None
+        t = self.thresh if self.thresh is not None else max(0.05, conf_thresh * 0.5)
+        return t if t < conf_thresh else None
+
+    def floor(self, conf_thresh: float) -> float:
+        """Lowest score this policy may ever keep for conf_thresh."""
+        t = self.secondary(conf_thresh)
+        return conf_thresh if t is None else t
+
+    def describe(self) -> str:
+        if self.mode == "topk":
+            return f"topk(k={self.min_k})"
+        return self.mode
+
+
+DEFAULT_FALLBACK = FallbackPolicy()
+
+
+@_traced("postprocess")
+def select_detections(
+    dets: np.ndarray,
+    target_hw: Tuple[int, int],
+    conf_thresh: float,
+    nms_params: Optional[dict] = None,
+    fallback: Optional[FallbackPolicy] = None,
+) -> Tuple[np.ndarray, Optional[dict]]:
+    """
+    Threshold, fallback and optional NMS(**nms_params) for one image's dets.
+    dets rows must be in descending score order, as decode_outputs returns them, so the primary rows
+    (score >= conf_thresh) and the fallback band (secondary <= score < conf_thresh) are two contiguous
+    slices found by binary search; no mask is built and each row is converted to a box at most once.
+    Returns (boxes, report) where report is None unless the fallback added boxes: {"policy", "thresh", "kept"}.
+    Rows below the secondary threshold never matter, so dense and sparse decodes report alike.
+    """
+    fallback = fallback or DEFAULT_FALLBACK
+    dets = np.asarray(dets)
+    if dets.ndim != 2 or dets.shape[0] == 0 or dets.shape[1] < 6:
+        return np.zeros(0, dtype=DETECTION_DTYPE), None
+    neg_scores = -dets[:, 0]
+
+    def cut(t: float) -> int:
+        # rows with score >= t; compared at the scores' precision, exactly as `scores >= t` would
+        return int(np.searchsorted(neg_scores, neg_scores.dtype.type(-t), side="right"))
+
+    n_primary = cut(conf_thresh)
+    boxes = _corner_boxes(dets[:n_primary], target_hw)
+    secondary = fallback.secondary(conf_thresh)
+    need = fallback.min_k if fallback.mode == "topk" else 1
+    report = None
+    if secondary is not None and len(boxes) < need:
+        band = dets[n_primary : cut(secondary)]
+        if len(band):
+            if fallback.mode == "topk":
+                extra = _corner_boxes(band, target_hw)[: need - len(boxes)]
+            else:
+                extra = _corner_boxes(band, target_hw)
+            boxes = np.concatenate([boxes, extra]) if len(boxes) else extra
+            report = {"policy": fallback.describe(), "thresh": round(float(secondary), 6), "kept": len(boxes)}
+    if nms_params is not None:
+        boxes = nms(boxes, **nms_params)
+    return boxes, report
+
+
+def select_detections_batch(
+    dets_list: List[np.ndarray],
+    target_hws: List[Tuple[int, int]],
+    conf_thresh: Union[float, List[float]],
+    nms_params: Optional[dict] = None,
+    fallback: Optional[FallbackPolicy] = None,
+) -> List[Tuple[np.ndarray, Optional[dict]]]:
+    """
+    select_detections for a batch of images: thresholds/fallback per image, then one batched_nms over
+    all of them instead of a per-image NMS loop. conf_thresh may be a single value or one per image.
+    """
+    confs = [conf_thresh] * len(dets_list) if np.isscalar(conf_thresh) else list(conf_thresh)
+    selected = [select_detections(d, hw, c, None, fallback) for d, hw, c in zip(dets_list, target_hws, confs)]
+    if nms_params is not None and selected:
+        kept = batched_nms([boxes for boxes, _ in selected], **nms_params)
+        selected = [(boxes, report) for boxes, (_, report) in zip(kept, selected)]
+    return selected
+
+
+def draw_boxes(img_bgr: np.ndarray, boxes: np.ndarray, color: Tuple[int, int, int]) -> np.ndarray:
     out = img_bgr.copy()
-    for score, cls_id, x1, y1, x2, y2 in boxes:
-        x1i, y1i, x2i, y2i = map(int, [x1, y1, x2, y2])
+    if len(boxes) == 0:
+        return out
+    corners = np.stack([boxes["x1"], boxes["y1"], boxes["x2"], boxes["y2"]], axis=1).astype(np.int32)
+    for x1i, y1i, x2i, y2i in corners.tolist():
         cv2.rectangle(out, (x1i, y1i), (x2i, y2i), color, 2)
     return out
 
@@ -120,6 +481,209 @@ def load_anchors_from_onnx(onnx_path: str) -> Tuple[Optional[np.ndarray], Option
     return anchors, wh_scale, has_quality
 
 
+class UltraTinyODDecoder:
+    """
+    Reusable decoder for raw UltraTinyOD output [B, C, H, W].
+    Everything that depends only on the model and the output map size (anchor priors scaled by
+    wh_scale, grid offsets, per-anchor channel layout) is computed once per (na, h, w) and cached,
+    so decode() only does the per-frame math on the prediction tensor.
+    """
+
+    def __init__(
+        self,
+        anchors: np.ndarray,
+        has_quality: bool = False,
+        wh_scale: Optional[np.ndarray] = None,
+        topk: int = 100,
+    ) -> None:
+        self.anchors = np.asarray(anchors, dtype=np.float32)
+        self.na = self.anchors.shape[0]
+        self.has_quality = has_quality
+        self.wh_scale = wh_scale
+        self.topk = int(topk)
+        anchor_use = self.anchors
+        if wh_scale is not None and wh_scale.shape == self.anchors.shape:
+            anchor_use = anchor_use * wh_scale
+        self._pw = anchor_use[:, 0].reshape(1, self.na, 1, 1)
+        self._ph = anchor_use[:, 1].reshape(1, self.na, 1, 1)
+        self._geometry = {}
+
+    @classmethod
+    def from_session_info(cls, session_info: dict, topk: int = 100) -> "UltraTinyODDecoder":
+        return cls(
+            session_info["anchors"],
+            has_quality=session_info.get("has_quality", False),
+            wh_scale=session_info.get("wh_scale"),
+            topk=topk,
+        )
+
+    def _grid(self, c: int, h: int, w: int) -> dict:
+        key = (self.na, h, w)
+        geo = self._geometry.get(key)
+        if geo is None:
+            if c % self.na != 0:
+                raise ValueError(f"Channel/anchor mismatch: C={c}, anchors={self.na}")
+            per_anchor = c // self.na
+            gy, gx = np.meshgrid(np.arange(h, dtype=np.float32), np.arange(w, dtype=np.float32), indexing="ij")
+            geo = {
+                "per_anchor": per_anchor,
+                "quality_extra": 1 if self.has_quality and per_anchor >= 6 else 0,
+                "gx": gx.reshape(1, 1, h, w),
+                "gy": gy.reshape(1, 1, h, w),
+                "gx_flat": gx.reshape(-1),
+                "gy_flat": gy.reshape(-1),
+            }
+            self._geometry[key] = geo
+        elif c != geo["per_anchor"] * self.na:
+            raise ValueError(f"Channel/anchor mismatch: C={c}, anchors={self.na}")
+        return geo
+
+    def decode(self, raw_out: np.ndarray, conf_floor: Optional[float] = None) -> List[np.ndarray]:
+        """
+        [B, C, H, W] -> B x [N, 6] (score, cls, cx, cy, bw, bh), normalized coords.
+        With conf_floor set, uses the sparse path and only returns detections scoring >= conf_floor;
+        otherwise decodes every cell (dense reference path).
+        """
+        if raw_out.ndim == 3:
+            raw_out = raw_out[None, ...]
+        if raw_out.ndim != 4:
+            raise ValueError(f"Unexpected raw output ndim={raw_out.ndim}; expected 4D map.")
+        if conf_floor is not None:
+            return self._decode_sparse(raw_out, float(conf_floor))
+        b, c, h, w = raw_out.shape
+        geo = self._grid(c, h, w)
+        na = self.na
+        quality_extra = geo["quality_extra"]
+
+        pred = raw_out.reshape(b, na, geo["per_anchor"], h, w)
+        tx = pred[:, :, 0]
+        ty = pred[:, :, 1]
+        tw = pred[:, :, 2]
+        th = pred[:, :, 3]
+        obj = pred[:, :, 4]
+        quality = pred[:, :, 5] if quality_extra else None
+        cls_logits = pred[:, :, (5 + quality_extra) :]
+
+        obj_sig = sigmoid_np(obj)
+        cls_sig = sigmoid_np(cls_logits)
+        score_base = obj_sig
+        if quality is not None:
+            score_base = score_base * sigmoid_np(quality)
+        scores = score_base[:, :, None] * cls_sig  # [B, A, C, H, W]
+
+        cx = (sigmoid_np(tx) + geo["gx"]) / float(w)
+        cy = (sigmoid_np(ty) + geo["gy"]) / float(h)
+        bw = self._pw * softplus_np(tw)  # no cap; allow large scaling for tiny anchors
+        bh = self._ph * softplus_np(th)
+
+        best_cls = scores.argmax(axis=2)  # [B, A, H, W]
+        best_scores = scores.max(axis=2)
+
+        cx_flat = cx.reshape(b, -1)
+        cy_flat = cy.reshape(b, -1)
+        bw_flat = bw.reshape(b, -1)
+        bh_flat = bh.reshape(b, -1)
+        scores_flat = best_scores.reshape(b, -1)
+        cls_flat = best_cls.reshape(b, -1)
+
+        k = min(self.topk, scores_flat.shape[1])
+        top_idx = np.argsort(-scores_flat, axis=1)[:, :k]
+
+        def _gather(t: np.ndarray) -> np.ndarray:
+            return np.take_along_axis(t, top_idx, axis=1)
+
+        top_scores = _gather(scores_flat)
+        top_cls = _gather(cls_flat)
+        top_cx = _gather(cx_flat)
+        top_cy = _gather(cy_flat)
+        top_bw = _gather(bw_flat)
+        top_bh = _gather(bh_flat)
+
+        dets: List[np.ndarray] = []
+        for i in range(b):
+            mask = (top_scores[i] > 0.0)
+            if not np.any(mask):
+                dets.append(np.zeros((0, 6), dtype=np.float32))
+                continue
+            stacked = np.stack(
+                [
+                    top_scores[i][mask],
+                    top_cls[i][mask].astype(np.float32),
+                    top_cx[i][mask],
+                    top_cy[i][mask],
+                    top_bw[i][mask],
+                    top_bh[i][mask],
+                ],
+                axis=-1,
+            )
+            finite_mask = np.all(np.isfinite(stacked), axis=-1)
+            stacked = stacked[finite_mask]
+            dets.append(stacked)
+        return dets
+
+    def _decode_sparse(self, raw_out: np.ndarray, conf_floor: float) -> List[np.ndarray]:
+        """
+        Threshold-first decode. The final score obj * quality * cls can never exceed obj * quality,
+        so cells whose objectness term is below the floor are dropped before any class or box math.
+        Survivors are ranked with argpartition; results match the dense path filtered at conf_floor.
+        """
+        b, c, h, w = raw_out.shape
+        geo = self._grid(c, h, w)
+        quality_extra = geo["quality_extra"]
+        pred = raw_out.reshape(b, self.na, geo["per_anchor"], h * w)
+
+        score_base = sigmoid_np(pred[:, :, 4])  # [B, A, HW]
+        if quality_extra:
+            score_base = score_base * sigmoid_np(pred[:, :, 5])
+        # dense path keeps score > 0 only; mirror that for a zero floor
+        cand = score_base > 0.0 if conf_floor <= 0.0 else score_base >= conf_floor
+        bi, ai, pi = np.nonzero(cand)
+        if bi.size == 0:
+            return [np.zeros((0, 6), dtype=np.float32) for _ in range(b)]
+
+        sel = pred[bi, ai, :, pi]  # [N, per_anchor]
+        cls_sig = sigmoid_np(sel[:, (5 + quality_extra) :])
+        scores = score_base[bi, ai, pi][:, None] * cls_sig
+        best_cls = scores.argmax(axis=1)
+        best_scores = scores[np.arange(scores.shape[0]), best_cls]
+        keep = best_scores > 0.0 if conf_floor <= 0.0 else best_scores >= conf_floor
+        bi, ai, pi, sel = bi[keep], ai[keep], pi[keep], sel[keep]
+        best_cls, best_scores = best_cls[keep], best_scores[keep]
+
+        # np.nonzero yields row-major order, so each image's candidates are one contiguous run
+        bounds = np.searchsorted(bi, np.arange(b + 1))
+        dets: List[np.ndarray] = []
+        for i in range(b):
+            lo, hi = bounds[i], bounds[i + 1]
+            if lo == hi:
+                dets.append(np.zeros((0, 6), dtype=np.float32))
+                continue
+            s_i = best_scores[lo:hi]
+            k = min(self.topk, s_i.shape[0])
+            idx = np.argpartition(-s_i, k - 1)[:k] if k < s_i.shape[0] else np.arange(s_i.shape[0])
+            idx = idx[np.argsort(-s_i[idx])] + lo
+            a_i, p_i, r_i = ai[idx], pi[idx], sel[idx]
+            stacked = np.stack(
+                [
+                    best_scores[idx],
+                    best_cls[idx].astype(np.float32),
+                    (sigmoid_np(r_i[:, 0]) + geo["gx_flat"][p_i]) / float(w),
+                    (sigmoid_np(r_i[:, 1]) + geo["gy_flat"][p_i]) / float(h),
+                    self._pw.reshape(-1)[a_i] * softplus_np(r_i[:, 2]),
+                    self._ph.reshape(-1)[a_i] * softplus_np(r_i[:, 3]),
+                ],
+                axis=-1,
+            )
+            finite_mask = np.all(np.isfinite(stacked), axis=-1)
+            dets.append(stacked[finite_mask])
+        return dets
+
+
+def decode_floor(conf_thresh: float, fallback: Optional[FallbackPolicy] = None) -> float:
+    """Lowest score select_detections may accept for conf_thresh (including its fallback)."""
+    return (fallback or DEFAULT_FALLBACK).floor(conf_thresh)
+
+
 def decode_ultratinyod_raw(
     raw_out: np.ndarray,
     anchors: np.ndarray,
@@ -127,106 +691,85 @@ def decode_ultratinyod_raw(
     has_quality: bool = False,
     wh_scale: Optional[np.ndarray] = None,
     topk: int = 100,
-) -> np.ndarray:
+) -> List[np.ndarray]:
     """
-    Decode raw UltraTinyOD output [B, C, H, W] -> [N, 6] (score, cls, cx, cy, bw, bh), normalized coords.
-    """
-    if raw_out.ndim == 3:
-        raw_out = raw_out[None, ...]
-    if raw_out.ndim != 4:
-        raise ValueError(f"Unexpected raw output ndim={raw_out.ndim}; expected 4D map.")
-    b, c, h, w = raw_out.shape
-    anchors = np.asarray(anchors, dtype=np.float32)
-    na = anchors.shape[0]
-    if c % na != 0:
-        raise ValueError(f"Channel/anchor mismatch: C={c}, anchors={na}")
-    per_anchor = c // na
-    quality_extra = 1 if has_quality and per_anchor >= 6 else 0
-
-    pred = raw_out.reshape(b, na, per_anchor, h, w)
-    tx = pred[:, :, 0]
-    ty = pred[:, :, 1]
-    tw = pred[:, :, 2]
-    th = pred[:, :, 3]
-    obj = pred[:, :, 4]
-    quality = pred[:, :, 5] if quality_extra else None
-    cls_logits = pred[:, :, (5 + quality_extra) :]
-
-    obj_sig = sigmoid_np(obj)
-    cls_sig = sigmoid_np(cls_logits)
-    score_base = obj_sig
-    if quality is not None:
-        score_base = score_base * sigmoid_np(quality)
-    scores = score_base[..., None] * cls_sig  # [B, A, H, W, C]
-
-    gy, gx = np.meshgrid(np.arange(h, dtype=np.float32), np.arange(w, dtype=np.float32), indexing="ij")
-    gx = gx.reshape(1, 1, h, w)
-    gy = gy.reshape(1, 1, h, w)
-
-    anchor_use = anchors
-    if wh_scale is not None and wh_scale.shape == anchors.shape:
-        anchor_use = anchor_use * wh_scale
-    pw = anchor_use[:, 0].reshape(1, na, 1, 1)
-    ph = anchor_use[:, 1].reshape(1, na, 1, 1)
-
-    cx = (sigmoid_np(tx) + gx) / float(w)
-    cy = (sigmoid_np(ty) + gy) / float(h)
-    bw = pw * softplus_np(tw)  # no cap; allow large scaling for tiny anchors
-    bh = ph * softplus_np(th)
-
-    best_cls = scores.argmax(axis=-1)  # [B, A, H, W]
-    best_scores = scores.max(axis=-1)
-
-    cx_flat = cx.reshape(b, -1)
-    cy_flat = cy.reshape(b, -1)
-    bw_flat = bw.reshape(b, -1)
-    bh_flat = bh.reshape(b, -1)
-    scores_flat = best_scores.reshape(b, -1)
-    cls_flat = best_cls.reshape(b, -1)
-
-    k = min(int(topk), scores_flat.shape[1])
-    top_idx = np.argsort(-scores_flat, axis=1)[:, :k]
-
-    def _gather(t: np.ndarray) -> np.ndarray:
-        return np.take_along_axis(t, top_idx, axis=1)
-
-    top_scores = _gather(scores_flat)
-    top_cls = _gather(cls_flat)
-    top_cx = _gather(cx_flat)
-    top_cy = _gather(cy_flat)
-    top_bw = _gather(bw_flat)
-    top_bh = _gather(bh_flat)
-
-    dets = []
-    for i in range(b):
-        mask = (top_scores[i] > 0.0)
-        if not np.any(mask):
-            continue
-        stacked = np.stack(
-            [
-                top_scores[i][mask],
-                top_cls[i][mask].astype(np.float32),
-                top_cx[i][mask],
-                top_cy[i][mask],
-                top_bw[i][mask],
-                top_bh[i][mask],
-            ],
-            axis=-1,
-        )
-        finite_mask = np.all(np.isfinite(stacked), axis=-1)
-        stacked = stacked[finite_mask]
-        dets.append(stacked)
-    if not dets:
-        return np.zeros((0, 6), dtype=np.float32)
-    return dets[0]
+    Decode raw UltraTinyOD output [B, C, H, W] -> B x [N, 6] (score, cls, cx, cy, bw, bh), normalized coords.
+    Always returns one detection array per image (empty arrays for images without detections).
+    One-shot convenience wrapper; keep an UltraTinyODDecoder around to reuse the cached geometry.
+    """
+    return UltraTinyODDecoder(anchors, has_quality=has_quality, wh_scale=wh_scale, topk=topk).decode(raw_out)
+
+
+def _static_batch_size(input_shape) -> Optional[int]:
+    """Return the fixed batch dim of the model input, or None when it is dynamic."""
+    if not input_shape:
+        return None
+    dim = input_shape[0]
+    return dim if isinstance(dim, int) and dim > 0 else None
 
 
-def load_session(onnx_path: str, img_size: Tuple[int, int]):
-    """Load ONNX session and infer whether outputs already include post-process."""
-    session = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+_META_CACHE_VERSION = 1
+
+
+def model_hash(onnx_path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of the model file contents (used to key caches)."""
+    h = hashlib.sha256()
+    with open(onnx_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _meta_cache_path(onnx_path: str) -> Path:
+    return Path(f"{onnx_path}.uhdmeta.json")
+
+
+def _load_cached_layout(onnx_path: str, digest: str, anchor_hint: Optional[int]) -> Optional[dict]:
+    path = _meta_cache_path(onnx_path)
+    if not path.exists():
+        return None
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as exc:
+        print(f"[WARN] Ignoring unreadable metadata cache {path}: {exc}")
+        return None
+    if data.get("version") != _META_CACHE_VERSION or data.get("model_sha256") != digest or data.get("anchor_hint") != anchor_hint:
+        return None
+    layout = data["layout"]
+    for key in ("anchors", "wh_scale"):
+        if layout.get(key) is not None:
+            layout[key] = np.asarray(layout[key], dtype=np.float32)
+    layout["output_shape"] = tuple(layout["output_shape"]) if layout.get("output_shape") is not None else None
+    return layout
+
+
+def _save_cached_layout(onnx_path: str, digest: str, anchor_hint: Optional[int], layout: dict) -> None:
+    path = _meta_cache_path(onnx_path)
+    serializable = dict(layout)
+    for key in ("anchors", "wh_scale"):
+        if serializable.get(key) is not None:
+            serializable[key] = np.asarray(serializable[key]).tolist()
+    if serializable.get("output_shape") is not None:
+        serializable["output_shape"] = [d if isinstance(d, int) else str(d) for d in serializable["output_shape"]]
+    data = {
+        "version": _META_CACHE_VERSION,
+        "model_sha256": digest,
+        "anchor_hint": anchor_hint,
+        "layout": serializable,
+    }
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        # write-then-rename so concurrent first starts (e.g. --workers) never see a partial file
+        tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError as exc:
+        print(f"[WARN] Could not write metadata cache {path}: {exc}")
+
+
+def _probe_layout(session: ort.InferenceSession, onnx_path: str, img_size: Tuple[int, int], anchor_hint: Optional[int]) -> dict:
+    """Detect decoded vs raw outputs (dummy forward + ONNX initializer scan for raw models)."""
     input_info = session.get_inputs()[0]
     outputs_info = session.get_outputs()
-    anchor_hint = _parse_anchor_hint_from_path(onnx_path)
 
     decoded_output = None
     for o in outputs_info:
@@ -284,19 +827,178 @@ def load_session(onnx_path: str, img_size: Tuple[int, int]):
         decoded = True
         output_shape = next(o.shape for o in outputs_info if o.name == decoded_output)
 
-    kind = "decoded output" if decoded else "raw output + demo post-process"
-    print(f"[INFO] Detected {kind} (output shape: {output_shape})")
-    return session, {
+    return {
         "decoded": decoded,
         "anchors": anchors,
         "wh_scale": wh_scale,
         "has_quality": has_quality or wh_scale is not None,
         "raw_channels": raw_channels if not decoded else None,
-        "anchor_hint": anchor_hint,
-        "input_name": input_info.name,
         "decoded_output": decoded_output,
         "raw_output": raw_output,
+        "output_shape": tuple(output_shape) if output_shape is not None else None,
+    }
+
+
+_GRAPH_OPT_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+_EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def build_session_options(
+    intra_op_threads: Optional[int] = None,
+    inter_op_threads: Optional[int] = None,
+    execution_mode: str = "sequential",
+    graph_opt_level: str = "all",
+    enable_mem_pattern: bool = True,
+    enable_cpu_mem_arena: bool = True,
+) -> ort.SessionOptions:
+    """Translate demo-level tuning knobs into ORT SessionOptions (None/defaults keep ORT's choice)."""
+    if execution_mode not in _EXECUTION_MODES:
+        raise ValueError(f"Unknown execution_mode '{execution_mode}'; expected one of {sorted(_EXECUTION_MODES)}")
+    if graph_opt_level not in _GRAPH_OPT_LEVELS:
+        raise ValueError(f"Unknown graph_opt_level '{graph_opt_level}'; expected one of {sorted(_GRAPH_OPT_LEVELS)}")
+    sess_options = ort.SessionOptions()
+    if intra_op_threads:
+        sess_options.intra_op_num_threads = int(intra_op_threads)
+    if inter_op_threads:
+        sess_options.inter_op_num_threads = int(inter_op_threads)
+    sess_options.execution_mode = _EXECUTION_MODES[execution_mode]
+    sess_options.graph_optimization_level = _GRAPH_OPT_LEVELS[graph_opt_level]
+    sess_options.enable_mem_pattern = bool(enable_mem_pattern)
+    sess_options.enable_cpu_mem_arena = bool(enable_cpu_mem_arena)
+    return sess_options
+
+
+def _host_isa_tag() -> str:
+    """Short hash of the CPU model, its ISA feature flags and the available ORT providers."""
+    flags = ""
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as fh:
+            for line in fh:
+                # x86 lists extensions under 'flags', ARM under 'Features'
+                if line.lower().startswith(("flags", "features")):
+                    flags = " ".join(sorted(line.split(":", 1)[1].split()))
+                    break
+    except OSError:
+        pass
+    key = "|".join([platform.machine(), _cpu_model(), flags, ",".join(ort.get_available_providers())])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+
+
+def _optimized_model_path(cache_dir: Path, onnx_path: str, digest: str, graph_opt_level: str, fmt: str) -> Path:
+    # Optimized graphs depend on the source model, the optimization level and the ORT build; at "all",
+    # layout transforms (NCHWc) are specific to the CPU they ran on, so the host ISA is part of the key.
+    stem = Path(onnx_path).stem
+    return cache_dir / f"{stem}.{digest[:16]}.{graph_opt_level}.ort{ort.__version__}.{_host_isa_tag()}.{fmt}"
+
+
+def load_session(
+    onnx_path: str,
+    img_size: Tuple[int, int],
+    intra_op_threads: Optional[int] = None,
+    use_meta_cache: bool = True,
+    inter_op_threads: Optional[int] = None,
+    execution_mode: str = "sequential",
+    graph_opt_level: str = "all",
+    enable_mem_pattern: bool = True,
+    enable_cpu_mem_arena: bool = True,
+    optimized_cache_dir: Optional[Path] = None,
+    optimized_format: str = "ort",
+    sparse_decode: bool = True,
+    profile_prefix: Optional[str] = None,
+):
+    """
+    Load ONNX session and infer whether outputs already include post-process.
+    The detected layout is cached in a '<model>.uhdmeta.json' sidecar keyed by the model's SHA-256,
+    so later starts skip the dummy forward and the second ONNX parse.
+    With optimized_cache_dir set, the graph optimized at graph_opt_level is serialized there
+    (ONNX or ORT format) on first load and loaded directly, without re-optimizing, afterwards.
+    sparse_decode=False makes decode_outputs always use the dense reference decoder.
+    profile_prefix turns on onnxruntime's profiler (per-operator events, written by end_profiling()
+    to '<profile_prefix>_<timestamp>.json'); see write_profile_trace.
+    """
+    if optimized_format not in ("onnx", "ort"):
+        raise ValueError(f"Unknown optimized_format '{optimized_format}'; expected 'onnx' or 'ort'")
+    sess_options = build_session_options(
+        intra_op_threads=intra_op_threads,
+        inter_op_threads=inter_op_threads,
+        execution_mode=execution_mode,
+        graph_opt_level=graph_opt_level,
+        enable_mem_pattern=enable_mem_pattern,
+        enable_cpu_mem_arena=enable_cpu_mem_arena,
+    )
+    if profile_prefix is not None:
+        Path(profile_prefix).parent.mkdir(parents=True, exist_ok=True)
+        sess_options.enable_profiling = True
+        sess_options.profile_file_prefix = str(profile_prefix)
+    digest = model_hash(onnx_path) if (use_meta_cache or optimized_cache_dir is not None) else None
+    model_to_load = onnx_path
+    opt_tmp = None
+    if optimized_cache_dir is not None:
+        optimized_cache_dir = Path(optimized_cache_dir)
+        opt_path = _optimized_model_path(optimized_cache_dir, onnx_path, digest, graph_opt_level, optimized_format)
+        if opt_path.exists():
+            print(f"[INFO] Loading optimized model from cache: {opt_path}")
+            model_to_load = str(opt_path)
+            if optimized_format == "ort":
+                sess_options.add_session_config_entry("session.load_model_format", "ORT")
+            # Already optimized; don't spend startup time re-running graph transforms.
+            sess_options.graph_optimization_level = _GRAPH_OPT_LEVELS["disable"]
+        else:
+            optimized_cache_dir.mkdir(parents=True, exist_ok=True)
+            # ORT writes during session creation; a per-process temp file renamed into place keeps
+            # concurrent workers from interleaving writes and readers from seeing a partial model.
+            opt_tmp = opt_path.with_name(f"{opt_path.name}.{os.getpid()}.tmp")
+            sess_options.optimized_model_filepath = str(opt_tmp)
+            if optimized_format == "ort":
+                sess_options.add_session_config_entry("session.save_model_format", "ORT")
+            print(f"[INFO] Writing optimized model to cache: {opt_path}")
+    try:
+        session = ort.InferenceSession(model_to_load, sess_options=sess_options, providers=["CPUExecutionProvider"])
+        if opt_tmp is not None and opt_tmp.exists():
+            os.replace(opt_tmp, opt_path)
+    finally:
+        if opt_tmp is not None and opt_tmp.exists():
+            opt_tmp.unlink()
+    input_info = session.get_inputs()[0]
+    anchor_hint = _parse_anchor_hint_from_path(onnx_path)
+
+    layout = None
+    if use_meta_cache:
+        layout = _load_cached_layout(onnx_path, digest, anchor_hint)
+        if layout is not None:
+            print(f"[INFO] Using cached model metadata ({_meta_cache_path(onnx_path).name})")
+    if layout is None:
+        layout = _probe_layout(session, onnx_path, img_size, anchor_hint)
+        if digest is not None:
+            _save_cached_layout(onnx_path, digest, anchor_hint, layout)
+
+    kind = "decoded output" if layout["decoded"] else "raw output + demo post-process"
+    print(f"[INFO] Detected {kind} (output shape: {layout['output_shape']})")
+    session_info = {
+        "decoded": layout["decoded"],
+        "anchors": layout["anchors"],
+        "wh_scale": layout["wh_scale"],
+        "has_quality": layout["has_quality"],
+        "raw_channels": layout["raw_channels"],
+        "anchor_hint": anchor_hint,
+        "input_name": input_info.name,
+        "max_batch": _static_batch_size(input_info.shape),
+        "decoded_output": layout["decoded_output"],
+        "raw_output": layout["raw_output"],
+        "model_sha256": digest,
+        "sparse_decode": sparse_decode,
     }
+    if not layout["decoded"] and layout["anchors"] is not None:
+        session_info["decoder"] = UltraTinyODDecoder.from_session_info(session_info)
+    return session, session_info
 
 
 def run_and_decode(
@@ -304,19 +1006,63 @@ def run_and_decode(
     session_info: dict,
     inp: np.ndarray,
     conf_thresh: float,
+    fallback: Optional[FallbackPolicy] = None,
 ) -> np.ndarray:
+    """Run a single [1, 3, H, W] input and return its [N, 6] detections."""
+    return run_and_decode_batch(session, session_info, inp, conf_thresh, fallback)[0]
+
+
+def run_and_decode_batch(
+    session: ort.InferenceSession,
+    session_info: dict,
+    inp: np.ndarray,
+    conf_thresh: float,
+    fallback: Optional[FallbackPolicy] = None,
+) -> List[np.ndarray]:
+    """Run a [B, 3, H, W] input in one session.run and return one [N, 6] array per image."""
+    outputs, run_outs = run_session(session, session_info, inp)
+    return decode_outputs(session_info, outputs, run_outs, conf_thresh, fallback)
+
+
+def run_session(
+    session: ort.InferenceSession,
+    session_info: dict,
+    inp: np.ndarray,
+) -> Tuple[List[str], List[np.ndarray]]:
+    """Inference half of run_and_decode_batch: returns the requested output names and values."""
     if session_info.get("decoded", False):
-        dets = session.run([session_info["decoded_output"]], {session_info["input_name"]: inp})[0]
-        return dets[0] if dets.ndim >= 3 else dets
+        outputs = [session_info["decoded_output"]]
+    else:
+        # Raw path: prefer cached anchors/wh_scale from ONNX outputs
+        outputs = [session_info.get("raw_output") or session.get_outputs()[0].name]
+        if session_info.get("anchors") is None or session_info.get("wh_scale") is None:
+            # If anchors/wh_scale were not cached, fetch them from ONNX outputs
+            outputs = [o.name for o in session.get_outputs()]
+    return outputs, session.run(outputs, {session_info["input_name"]: inp})
+
+
+@_traced("decode")
+def decode_outputs(
+    session_info: dict,
+    outputs: List[str],
+    run_outs: List[np.ndarray],
+    conf_thresh: Optional[float] = None,
+    fallback: Optional[FallbackPolicy] = None,
+) -> List[np.ndarray]:
+    """
+    Decode half of run_and_decode_batch: turn session outputs into one [N, 6] array per image,
+    rows in descending score order (select_detections relies on it).
+    Given conf_thresh (and session_info['sparse_decode'], the default), raw outputs are decoded
+    threshold-first and candidates below decode_floor(conf_thresh, fallback) are never materialized.
+    """
+    if session_info.get("decoded", False):
+        dets = run_outs[0]
+        # the raw decoder already ranks its top-k; models with built-in decoding are not guaranteed to
+        per_image = list(dets) if dets.ndim >= 3 else [dets]
+        return [d[np.argsort(-d[:, 0], kind="stable")] if d.ndim == 2 and len(d) > 1 else d for d in per_image]
 
-    # Raw path: prefer cached anchors/wh_scale from ONNX outputs
     anchors = session_info.get("anchors")
     wh_scale = session_info.get("wh_scale")
-    outputs = [session_info.get("raw_output") or session.get_outputs()[0].name]
-    if anchors is None or wh_scale is None:
-        # If anchors/wh_scale were not cached, fetch them from ONNX outputs
-        outputs = [o.name for o in session.get_outputs()]
-    run_outs = session.run(outputs, {session_info["input_name"]: inp})
 
     # Identify raw / anchors / wh_scale in the returned list
     raw = None
@@ -351,54 +1097,1143 @@ def run_and_decode(
         anchors = _build_fallback_anchors(na)
         print(f"[WARN] Anchors not found in ONNX; using fallback anchors (A={na}).")
 
-    session_info["anchors"] = anchors
-    if wh_scale is not None:
-        session_info["wh_scale"] = wh_scale
+    decoder = session_info.get("decoder")
+    if decoder is None or anchors is not session_info.get("anchors") or wh_scale is not session_info.get("wh_scale"):
+        # anchors/wh_scale were discovered on this call; (re)build the cached decoder once
+        session_info["anchors"] = anchors
+        if wh_scale is not None:
+            session_info["wh_scale"] = wh_scale
+        decoder = UltraTinyODDecoder.from_session_info(session_info)
+        session_info["decoder"] = decoder
 
-    return decode_ultratinyod_raw(
-        raw,
-        anchors=anchors,
-        conf_thresh=0.0,  # avoid double-thresholding; postprocess will apply user conf
-        has_quality=session_info.get("has_quality", False),
-        wh_scale=wh_scale,
-    )
+    # select_detections applies the user conf; the floor only prunes what it could never accept
+    conf_floor = None
+    if conf_thresh is not None and session_info.get("sparse_decode", True):
+        conf_floor = decode_floor(conf_thresh, fallback)
+    return decoder.decode(raw, conf_floor)
 
 
-def run_images(
+class BoundRunner:
+    """
+    Steady-state runner for a fixed maximum batch: the input and output buffers are allocated once
+    and bound to the session through ORT IO binding, so per-frame calls only write pixels into
+    `input` and read results out of the preallocated outputs. Not thread-safe; use one per
+    inference thread.
+    """
+
+    def __init__(
+        self,
+        session: ort.InferenceSession,
+        session_info: dict,
+        img_size: Tuple[int, int],
+        batch_size: int = 1,
+    ) -> None:
+        self.session = session
+        self.session_info = session_info
+        self.img_size = img_size
+        self.batch_size = self.effective_batch(session_info, batch_size)
+        h, w = img_size
+        self.input = np.zeros((self.batch_size, 3, h, w), dtype=np.float32)
+        self._scratch = np.empty((h, w, 3), dtype=np.uint8)
+        # One warm-up run at full batch settles which outputs are needed and their shapes.
+        self.output_names, outs = run_session(session, session_info, self.input)
+        # Copies, not empty buffers: unbatched outputs (e.g. anchors) are then valid before the first bound run.
+        self.outputs = [np.array(o) for o in outs]
+        self._batched = [o.ndim >= 3 and o.shape[0] == self.batch_size for o in outs]
+        self._bindings = {}
+
+    @staticmethod
+    def effective_batch(session_info: dict, batch_size: int) -> int:
+        """Requested batch size clamped to the model's fixed batch, if it has one."""
+        batch_size = max(1, int(batch_size))
+        max_batch = session_info.get("max_batch")
+        return min(batch_size, max_batch) if max_batch is not None else batch_size
+
+    def _binding(self, n: int) -> ort.IOBinding:
+        # Leading-axis slices of C-contiguous buffers stay contiguous, so every sub-batch binds
+        # views of the same memory; bindings are built once per distinct n.
+        binding = self._bindings.get(n)
+        if binding is None:
+            binding = self.session.io_binding()
+            binding.bind_ortvalue_input(self.session_info["input_name"], ort.OrtValue.ortvalue_from_numpy(self.input[:n]))
+            for name, buf, batched in zip(self.output_names, self.outputs, self._batched):
+                binding.bind_ortvalue_output(name, ort.OrtValue.ortvalue_from_numpy(buf[:n] if batched else buf))
+            self._bindings[n] = binding
+        return binding
+
+    @_traced("preprocess")
+    def load_frame(self, index: int, img_bgr: np.ndarray) -> None:
+        """Preprocess one BGR frame into slot `index` of the bound input."""
+        preprocess_into(img_bgr, self.img_size, self.input[index], self._scratch)
+
+    @_traced("infer")
+    def infer(self, n: Optional[int] = None) -> List[np.ndarray]:
+        """Run the first n input slots; returns views of the bound outputs (overwritten by the next call)."""
+        n = self.batch_size if n is None else int(n)
+        if not 0 < n <= self.batch_size:
+            raise ValueError(f"n must be in [1, {self.batch_size}], got {n}")
+        self.session.run_with_iobinding(self._binding(n))
+        return [buf[:n] if batched else buf for buf, batched in zip(self.outputs, self._batched)]
+
+    def decode(
+        self,
+        run_outs: List[np.ndarray],
+        conf_thresh: Optional[float] = None,
+        fallback: Optional[FallbackPolicy] = None,
+    ) -> List[np.ndarray]:
+        dets = decode_outputs(self.session_info, self.output_names, run_outs, conf_thresh, fallback)
+        if self.session_info.get("decoded", False):
+            # decoded outputs are views into the bound buffer; detach them before the next run
+            dets = [d.copy() for d in dets]
+        return dets
+
+    def run(
+        self,
+        n: Optional[int] = None,
+        conf_thresh: Optional[float] = None,
+        fallback: Optional[FallbackPolicy] = None,
+    ) -> List[np.ndarray]:
+        """infer + decode: one [N, 6] detection array per loaded slot."""
+        return self.decode(self.infer(n), conf_thresh, fallback)
+
+
+JPEG_EXTS = {".jpg", ".jpeg", ".jpe", ".jfif"}
+# Largest first: libjpeg scales these in the DCT domain, so less data is decoded at all.
+_REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+# SOFn markers carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) share the range but do not.
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def read_jpeg_size(img_path: Path, data: Optional[bytes] = None) -> Optional[Tuple[int, int]]:
+    """Return (h, w) from the JPEG frame header without decoding pixels, or None if not parseable.
+    data, if given, is the file's content already in memory."""
+    try:
+        with io.BytesIO(data) if data is not None else open(img_path, "rb") as f:
+            if f.read(2) != b"\xff\xd8":
+                return None
+            while True:
+                byte = f.read(1)
+                while byte and byte != b"\xff":
+                    byte = f.read(1)
+                while byte == b"\xff":
+                    byte = f.read(1)
+                if not byte:
+                    return None
+                marker = byte[0]
+                if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                    continue  # standalone markers have no length field
+                seg_len = f.read(2)
+                if len(seg_len) < 2:
+                    return None
+                length = int.from_bytes(seg_len, "big")
+                if marker in _JPEG_SOF_MARKERS:
+                    sof = f.read(5)
+                    if len(sof) < 5:
+                        return None
+                    return int.from_bytes(sof[1:3], "big"), int.from_bytes(sof[3:5], "big")
+                f.seek(length - 2, os.SEEK_CUR)
+    except OSError:
+        return None
+
+
+def imread_for_model(
+    img_path: Path, img_size: Tuple[int, int], reduced_decode: bool = True, data: Optional[bytes] = None
+):
+    """
+    Decode an image for inference. For JPEGs with reduced_decode, picks the largest DCT-domain
+    reduction (1/8, 1/4, 1/2) whose output still covers img_size. data, if given, is the file's content
+    already read (e.g. to hash it) and is decoded in memory instead of opening the file again.
+    Returns (img_bgr or None, (orig_h, orig_w)); img_bgr may be smaller than the original.
+    """
+
+    def decode(flag: int) -> Optional[np.ndarray]:
+        if data is None:
+            return cv2.imread(str(img_path), flag)
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flag)
+
+    if reduced_decode and img_path.suffix.lower() in JPEG_EXTS:
+        size = read_jpeg_size(img_path, data)
+        if size is not None:
+            h, w = size
+            target_h, target_w = img_size
+            for factor, flag in _REDUCED_DECODE_FLAGS:
+                # libjpeg rounds scaled dimensions up
+                if -(-h // factor) >= target_h and -(-w // factor) >= target_w:
+                    img_bgr = decode(flag)
+                    if img_bgr is None:
+                        break
+                    rh, rw = img_bgr.shape[:2]
+                    # EXIF orientation is applied after decode and may swap the header's axes
+                    if (rh > rw) != (h > w) and h != w:
+                        h, w = w, h
+                    return img_bgr, (h, w)
+    img_bgr = decode(cv2.IMREAD_COLOR)
+    return img_bgr, (img_bgr.shape[:2] if img_bgr is not None else None)
+
+
+def _read_and_preprocess(
+    img_path: Path,
+    img_size: Tuple[int, int],
+    reduced_decode: bool = False,
+    cache: Optional[PredictionCache] = None,
+    render: bool = True,
+    entry_bytes: Optional[int] = None,
+):
+    """
+    Reader stage: decode one image and build its model input.
+    Returns (img_path, img_bgr, inp, orig_hw, cache_key, cached); orig_hw is None if unreadable.
+    On a cache hit inp is None and cached holds the packed outputs; without render the image is not
+    even decoded (img_bgr None).
+    """
+    key = cached = data = None
+    if cache is not None:
+        with _span("cache lookup", "io"):
+            # read once: the bytes are hashed for the key and, on a miss, decoded from memory
+            try:
+                data = img_path.read_bytes()
+            except OSError:
+                pass
+            key = cache.key_for(data) if data is not None else None
+            hit = cache.get(key, entry_bytes) if key is not None else None
+        if hit is not None:
+            orig_hw, cached = hit
+            if not render:
+                return img_path, None, None, orig_hw, key, cached
+    with _span("read", "io"):
+        img_bgr, orig_hw = imread_for_model(img_path, img_size, reduced_decode, data)
+    if img_bgr is None:
+        return img_path, None, None, None, key, None
+    if cached is not None:
+        return img_path, img_bgr, None, orig_hw, key, cached
+    inp = np.empty((1, 3, img_size[0], img_size[1]), dtype=np.float32)
+    with _span("preprocess"):
+        preprocess_into(img_bgr, img_size, inp)
+    return img_path, img_bgr, inp, orig_hw, key, None
+
+
+def _render_and_save(
+    img_path: Path,
+    img_bgr: np.ndarray,
+    boxes: np.ndarray,
+    report: Optional[dict],
+    out_dir: Path,
+    img_size: Tuple[int, int],
+    actual_size: bool,
+    orig_hw: Optional[Tuple[int, int]] = None,
+    render: bool = True,
+    root: Optional[Path] = None,
+) -> Tuple[Optional[Path], np.ndarray, Optional[dict]]:
+    """
+    Writer stage: draw and encode one selected result (boxes/report from select_detections_batch).
+    Boxes are in original-image pixels (orig_hw) even when img_bgr was decoded at reduced size;
+    the annotated image is written at the decoded size. With render=False nothing is drawn or written
+    and save_path is None. With root, the output keeps img_path's location relative to root.
+    """
+    if not render:
+        return None, boxes, report
+    h, w = orig_hw or img_bgr.shape[:2]
+    target_h, target_w = img_size if actual_size else (h, w)
+    if actual_size:
+        base, draw = cv2.resize(img_bgr, (target_w, target_h)), boxes
+    else:
+        base = img_bgr
+        sy, sx = img_bgr.shape[0] / h, img_bgr.shape[1] / w
+        draw = boxes if (sx, sy) == (1.0, 1.0) else scale_boxes(boxes, sx, sy)
+    with _span("draw"):
+        vis_out = draw_boxes(base, draw, (0, 0, 255))
+    if root is None:
+        save_path = out_dir / img_path.name
+    else:
+        save_path = out_dir / img_path.relative_to(root)
+        save_path.parent.mkdir(parents=True, exist_ok=True)
+    with _span("write", "io"):
+        cv2.imwrite(str(save_path), vis_out)
+    return save_path, boxes, report
+
+
+_READ_DONE = object()
+
+
+def _feed_readers(
+    images: List[Path],
+    img_size: Tuple[int, int],
+    pool: ThreadPoolExecutor,
+    read_q: "queue.Queue",
+    stop: threading.Event,
+    reduced_decode: bool = False,
+    cache_args: tuple = (),
+) -> None:
+    """Submit reads in file order; the bounded queue caps how many decoded frames are in flight."""
+    try:
+        for img_path in images:
+            if stop.is_set():
+                break
+            read_q.put(pool.submit(_read_and_preprocess, img_path, img_size, reduced_decode, *cache_args))
+    finally:
+        read_q.put(_READ_DONE)
+
+
+def _process_images(
     session: ort.InferenceSession,
     session_info: dict,
+    images: List[Path],
+    out_dir: Path,
+    img_size: Tuple[int, int],
+    conf_thresh: float,
+    actual_size: bool,
+    batch_size: int = 1,
+    read_workers: int = 4,
+    write_workers: int = 4,
+    queue_depth: int = 16,
+    reduced_decode: bool = False,
+    nms_params: Optional[dict] = None,
+    fallback: Optional[FallbackPolicy] = None,
+    render: bool = True,
+    cache: Optional[PredictionCache] = None,
+    root: Optional[Path] = None,
+):
+    """
+    Streaming read -> infer -> write pipeline over a list (or lazy iterable) of images.
+    Reads and writes run on thread pools (OpenCV releases the GIL during codec work) while the
+    calling thread runs inference. Yields (img_path, save_path, boxes, fallback_report) in input
+    order, with boxes set to None for unreadable files and save_path None for those or when
+    render=False. At most ~queue_depth decoded frames wait
+    on each side of the inference stage.
+    With a PredictionCache, images whose outputs are cached skip inference (and, without render,
+    decoding); only cache misses fill inference batches.
+    """
+    batch_size = max(1, int(batch_size))
+    max_batch = session_info.get("max_batch")
+    if max_batch is not None and batch_size > max_batch:
+        print(f"[WARN] Model input has a fixed batch of {max_batch}; --batch-size {batch_size} reduced to {max_batch}.")
+        batch_size = max_batch
+    queue_depth = max(int(queue_depth), batch_size)
+
+    runner = BoundRunner(session, session_info, img_size, batch_size)
+    cache_args = ()
+    if cache is not None:
+        # per-image (shape, dtype) of every batched output, i.e. what one cache entry holds
+        layout = [(buf.shape[1:], buf.dtype) for buf, batched in zip(runner.outputs, runner._batched) if batched]
+        cache_args = (cache, render, sum(int(np.prod(shape)) * np.dtype(dt).itemsize for shape, dt in layout))
+    read_q: "queue.Queue" = queue.Queue(maxsize=queue_depth)
+    pending_writes: "deque[Tuple[Path, Optional[Future]]]" = deque()
+    stop = threading.Event()
+
+    def _drain_writes(limit: int):
+        # Report results strictly in input order; unreadable files keep their slot (future=None).
+        while len(pending_writes) > limit:
+            img_path, fut = pending_writes.popleft()
+            if fut is None:
+                yield img_path, None, None, None
+                continue
+            yield (img_path, *fut.result())
+
+    def _run_cached(frames, n):
+        # Stack fresh and cached per-image outputs back into batch outputs so one decode covers both.
+        outs = runner.infer(n) if n else None
+        parts, fresh, j = [], [], 0
+        for _, _, x, orig_hw, key, cached in frames:
+            if orig_hw is None:
+                continue
+            if cached is None:
+                mine = [buf[j] for buf, batched in zip(outs, runner._batched) if batched]
+                if key is not None:
+                    fresh.append((key, orig_hw, PredictionCache.pack(mine)))
+                j += 1
+            else:
+                mine = PredictionCache.unpack(cached, layout)
+            parts.append(mine)
+        if fresh:
+            with _span("cache store", "io"):
+                cache.put_many(fresh)
+        if not parts:
+            return []
+        per_output = iter(zip(*parts))
+        run_outs = [np.stack(next(per_output)) if batched else buf for buf, batched in zip(runner.outputs, runner._batched)]
+        return runner.decode(run_outs, conf_thresh, fallback)
+
+    def _infer_and_submit(frames):
+        valid = [f[2] for f in frames if f[2] is not None]
+        for j, x in enumerate(valid):
+            runner.input[j] = x[0]
+        if cache is None:
+            dets = runner.run(len(valid), conf_thresh, fallback) if valid else []
+        else:
+            dets = _run_cached(frames, len(valid))
+        # one dets entry per readable frame (fresh and cached alike), in frame order
+        targets = [img_size if actual_size else f[3] for f in frames if f[3] is not None]
+        selected = iter(select_detections_batch(list(dets), targets, conf_thresh, nms_params, fallback))
+        for img_path, img_bgr, _, orig_hw, _, _ in frames:
+            yield from _drain_writes(queue_depth - 1)
+            if orig_hw is None:
+                pending_writes.append((img_path, None))
+                continue
+            boxes, report = next(selected)
+            pending_writes.append(
+                (
+                    img_path,
+                    writers.submit(
+                        _render_and_save,
+                        img_path,
+                        img_bgr,
+                        boxes,
+                        report,
+                        out_dir,
+                        img_size,
+                        actual_size,
+                        orig_hw,
+                        render,
+                        root,
+                    ),
+                )
+            )
+
+    with ThreadPoolExecutor(max_workers=max(1, int(read_workers)), thread_name_prefix="uhd-read") as readers, ThreadPoolExecutor(
+        max_workers=max(1, int(write_workers)), thread_name_prefix="uhd-write"
+    ) as writers:
+        feeder = threading.Thread(
+            target=_feed_readers,
+            args=(images, img_size, readers, read_q, stop, reduced_decode, cache_args),
+            name="uhd-feed",
+            daemon=True,
+        )
+        feeder.start()
+        try:
+            frames = []
+            n_valid = 0
+            while True:
+                item = read_q.get()
+                if item is _READ_DONE:
+                    break
+                frame = item.result()
+                frames.append(frame)
+                n_valid += frame[2] is not None
+                # cache hits do not fill a batch, so also cap how many of them wait for one
+                if n_valid >= batch_size or len(frames) >= queue_depth:
+                    yield from _infer_and_submit(frames)
+                    frames = []
+                    n_valid = 0
+            if frames:
+                yield from _infer_and_submit(frames)
+            yield from _drain_writes(0)
+        finally:
+            stop.set()
+            if cache is not None:
+                cache.flush()
+            # Unblock the feeder if it is waiting on a full queue.
+            while feeder.is_alive():
+                try:
+                    read_q.get_nowait()
+                except queue.Empty:
+                    feeder.join(timeout=0.05)
+
+
+def _manifest_record(img_path: Path, boxes: Optional[np.ndarray], fallback: Optional[dict] = None) -> dict:
+    if boxes is None:
+        return {"image": str(img_path), "error": "unreadable"}
+    record = {"image": str(img_path), "detections": detections_to_rows(boxes)}
+    if fallback is not None:
+        record["fallback"] = fallback
+    return record
+
+
+def detections_to_rows(boxes: np.ndarray) -> List[list]:
+    """DETECTION_DTYPE array -> JSON-friendly [[score, cls, x1, y1, x2, y2], ...] rows."""
+    if len(boxes) == 0:
+        return []
+    scores = np.round(boxes["score"].astype(np.float64), 6).tolist()
+    coords = np.round(
+        np.stack([boxes["x1"], boxes["y1"], boxes["x2"], boxes["y2"]], axis=1).astype(np.float64), 2
+    ).tolist()
+    return [[s, c, *xy] for s, c, xy in zip(scores, boxes["cls"].tolist(), coords)]
+
+
+def _process_store(
+    session: ort.InferenceSession,
+    session_info: dict,
+    store: FrameStore,
+    indices: List[int],
+    out_dir: Path,
+    img_size: Tuple[int, int],
+    conf_thresh: float,
+    actual_size: bool,
+    batch_size: int = 1,
+    write_workers: int = 4,
+    queue_depth: int = 16,
+    nms_params: Optional[dict] = None,
+    fallback: Optional[FallbackPolicy] = None,
+    render: bool = True,
+):
+    """
+    _process_images over a FrameStore: batches are converted straight from the memory-mapped frames
+    (contiguous runs are zero-copy slices), so there is no decode or resize stage. Yields the same
+    (label, save_path, boxes, fallback_report) tuples, with boxes in original-source pixels; annotated
+    outputs are drawn on the stored frames.
+    """
+    if tuple(store.img_size) != tuple(img_size):
+        raise ValueError(f"Frame store {store.path} holds {store.img_size} frames but --img-size is {img_size}")
+    runner = BoundRunner(session, session_info, img_size, batch_size)
+    pending: "deque[Tuple[Path, Future]]" = deque()
+    queue_depth = max(int(queue_depth), runner.batch_size)
+
+    with ThreadPoolExecutor(max_workers=max(1, int(write_workers)), thread_name_prefix="uhd-write") as writers:
+        for start in range(0, len(indices), runner.batch_size):
+            batch = indices[start : start + runner.batch_size]
+            n = len(batch)
+            contiguous = batch[-1] - batch[0] == n - 1
+            with _span("preprocess"):
+                frames = store.frames[batch[0] : batch[-1] + 1] if contiguous else store.frames[batch]
+                frames_to_input(frames, runner.input[:n])
+            orig_hws = [(int(store.orig_hw[i][0]), int(store.orig_hw[i][1])) for i in batch]
+            targets = [img_size if actual_size else hw for hw in orig_hws]
+            dets = runner.run(n, conf_thresh, fallback)
+            selected = select_detections_batch(dets, targets, conf_thresh, nms_params, fallback)
+            for j, (i, (boxes, report)) in enumerate(zip(batch, selected)):
+                while len(pending) >= queue_depth:
+                    label, fut = pending.popleft()
+                    yield (label, *fut.result())
+                img_bgr = np.ascontiguousarray(frames[j][:, :, ::-1])
+                fut = writers.submit(
+                    _render_and_save,
+                    Path(store.output_name(i)),
+                    img_bgr,
+                    boxes,
+                    report,
+                    out_dir,
+                    img_size,
+                    actual_size,
+                    orig_hws[j],
+                    render,
+                )
+                pending.append((Path(store.label(i)), fut))
+        while pending:
+            label, fut = pending.popleft()
+            yield (label, *fut.result())
+
+
+# Binary detection stream (.uhdd): a sequence of self-contained columnar blocks, one per flush.
+#   header  <4sIII  magic, n_frames, n_dets, key_bytes
+#   frames  frame int64, time float64, count uint32, fallback uint8   (n_frames each)
+#   dets    score f32, cls i32, x1 f32, y1 f32, x2 f32, y2 f32       (n_dets each, frame order)
+#   keys    utf-8, "\n"-joined, one (possibly empty) key per frame
+_STREAM_MAGIC = b"UHDD"
+_STREAM_HEADER = struct.Struct("<4sIII")
+_STREAM_FRAME_COLS = (("frame", np.int64), ("time", np.float64), ("count", np.uint32), ("fallback", np.uint8))
+_STREAM_DET_COLS = tuple((name, DETECTION_DTYPE[name]) for name in DETECTION_DTYPE.names)
+_STREAM_BINARY_SUFFIXES = {".uhdd", ".bin"}
+
+
+def _stream_block_size(n_frames: int, n_dets: int, key_bytes: int) -> int:
+    frame_bytes = sum(np.dtype(dt).itemsize for _, dt in _STREAM_FRAME_COLS)
+    det_bytes = sum(dt.itemsize for _, dt in _STREAM_DET_COLS)
+    return _STREAM_HEADER.size + n_frames * frame_bytes + n_dets * det_bytes + key_bytes
+
+
+def _iter_stream_blocks(buf: bytes):
+    """Yield (end_offset, columns) for each complete binary block; stops at the first torn one."""
+    pos = 0
+    while pos + _STREAM_HEADER.size <= len(buf):
+        magic, n_frames, n_dets, key_bytes = _STREAM_HEADER.unpack_from(buf, pos)
+        end = pos + _stream_block_size(n_frames, n_dets, key_bytes)
+        if magic != _STREAM_MAGIC or end > len(buf):
+            return
+        off = pos + _STREAM_HEADER.size
+        cols = {}
+        for name, dt, n in [(n_, d, n_frames) for n_, d in _STREAM_FRAME_COLS] + [(n_, d, n_dets) for n_, d in _STREAM_DET_COLS]:
+            cols[name] = np.frombuffer(buf, dtype=dt, count=n, offset=off)
+            off += n * np.dtype(dt).itemsize
+        keys = buf[off : off + key_bytes].decode("utf-8")
+        cols["key"] = keys.split("\n") if n_frames else []
+        yield end, cols
+        pos = end
+
+
+def read_detection_stream(path: Path) -> dict:
+    """
+    Load a binary detection stream into flat columns: frame/time/count/fallback/key per frame and a
+    DETECTION_DTYPE `detections` array; frame i owns detections[offsets[i]:offsets[i + 1]].
+    """
+    blocks = [cols for _, cols in _iter_stream_blocks(Path(path).read_bytes())]
+    out = {name: np.concatenate([b[name] for b in blocks]) if blocks else np.zeros(0, dt) for name, dt in _STREAM_FRAME_COLS}
+    out["key"] = [k for b in blocks for k in b["key"]]
+    dets = np.zeros(sum(len(b["score"]) for b in blocks), dtype=DETECTION_DTYPE)
+    for name, _ in _STREAM_DET_COLS:
+        if blocks:
+            dets[name] = np.concatenate([b[name] for b in blocks])
+    out["detections"] = dets
+    out["offsets"] = np.concatenate([[0], np.cumsum(out["count"], dtype=np.int64)])
+    return out
+
+
+class DetectionStream:
+    """
+    Append-only detection log, JSONL or binary columnar (.uhdd / .bin) by suffix, written flush_every
+    frames at a time. resume=True keeps an existing file (a torn tail is truncated) and fills next_frame
+    and done_keys from it; with scan=False only the tail is read, so done_keys stays empty.
+    """
+
+    def __init__(self, path: Path, flush_every: int = 64, resume: bool = False, scan: bool = True) -> None:
+        self.path = Path(path)
+        self.binary = self.path.suffix.lower() in _STREAM_BINARY_SUFFIXES
+        self.flush_every = max(1, int(flush_every))
+        self.next_frame = 0
+        self.done_keys = set()
+        self.written = 0
+        self._pending: List[tuple] = []
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if resume and self.path.exists():
+            if scan:
+                self._recover()
+            else:
+                self._recover_tail()
+            self._fh = open(self.path, "ab")
+        else:
+            self._fh = open(self.path, "wb")
+
+    def _recover(self) -> None:
+        buf = self.path.read_bytes()
+        valid_end = 0
+        if self.binary:
+            for end, cols in _iter_stream_blocks(buf):
+                valid_end = end
+                if len(cols["frame"]):
+                    self.next_frame = max(self.next_frame, int(cols["frame"].max()) + 1)
+                self.done_keys.update(k for k in cols["key"] if k)
+                self.written += len(cols["frame"])
+        else:
+            valid_end = buf.rfind(b"\n") + 1
+            for line in buf[:valid_end].splitlines():
+                if not line.strip():
+                    continue
+                rec = json.loads(line)
+                self.next_frame = max(self.next_frame, int(rec["frame"]) + 1)
+                if rec.get("image"):
+                    self.done_keys.add(rec["image"])
+                self.written += 1
+        self._truncate(valid_end, len(buf))
+
+    def _recover_tail(self) -> None:
+        with open(self.path, "rb") as fh:
+            size = fh.seek(0, os.SEEK_END)
+            valid_end = 0
+            if self.binary:
+                # hop from header to header; only the last complete block's frame column is read
+                pos, last = 0, None
+                while pos + _STREAM_HEADER.size <= size:
+                    fh.seek(pos)
+                    magic, n_frames, n_dets, key_bytes = _STREAM_HEADER.unpack(fh.read(_STREAM_HEADER.size))
+                    end = pos + _stream_block_size(n_frames, n_dets, key_bytes)
+                    if magic != _STREAM_MAGIC or end > size:
+                        break
+                    last, pos = (pos, n_frames), end
+                valid_end = pos
+                if last is not None and last[1]:
+                    fh.seek(last[0] + _STREAM_HEADER.size)
+                    frames = np.frombuffer(fh.read(last[1] * 8), dtype=np.int64)
+                    self.next_frame = int(frames.max()) + 1
+            else:
+                # read backwards until the last complete line (and where it starts) is in hand
+                pos, tail = size, b""
+                while pos > 0:
+                    step = min(1 << 16, pos)
+                    pos -= step
+                    fh.seek(pos)
+                    tail = fh.read(step) + tail
+                    end = tail.rfind(b"\n")
+                    if end >= 0 and (pos == 0 or tail.rfind(b"\n", 0, end) >= 0):
+                        break
+                end = tail.rfind(b"\n")
+                if end >= 0:
+                    valid_end = pos + end + 1
+                    last = tail[tail.rfind(b"\n", 0, end) + 1 : end]
+                    if last.strip():
+                        self.next_frame = int(json.loads(last)["frame"]) + 1
+        self._truncate(valid_end, size)
+
+    def _truncate(self, valid_end: int, size: int) -> None:
+        if valid_end < size:
+            print(f"[WARN] Dropping {size - valid_end} bytes of a torn trailing record in {self.path}")
+            with open(self.path, "r+b") as fh:
+                fh.truncate(valid_end)
+
+    def append(
+        self,
+        frame: int,
+        t: float,
+        boxes: np.ndarray,
+        key: Optional[str] = None,
+        fallback: Optional[dict] = None,
+    ) -> None:
+        self._pending.append((int(frame), float(t), boxes, key or "", fallback))
+        self.next_frame = max(self.next_frame, int(frame) + 1)
+        if key:
+            self.done_keys.add(key)
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    @_traced("stream_write", "io")
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        if self.binary:
+            self._fh.write(self._encode_block(self._pending))
+        else:
+            lines = []
+            for frame, t, boxes, key, fallback in self._pending:
+                rec = {"frame": frame, "time": round(t, 6)}
+                if key:
+                    rec["image"] = key
+                rec["detections"] = detections_to_rows(boxes)
+                if fallback is not None:
+                    rec["fallback"] = fallback
+                lines.append(json.dumps(rec) + "\n")
+            self._fh.write("".join(lines).encode("utf-8"))
+        self._fh.flush()
+        self.written += len(self._pending)
+        self._pending = []
+
+    @staticmethod
+    def _encode_block(pending: List[tuple]) -> bytes:
+        dets = np.concatenate([p[2] for p in pending]) if pending else np.zeros(0, DETECTION_DTYPE)
+        keys = "\n".join(p[3].replace("\n", " ") for p in pending).encode("utf-8")
+        frame_cols = (
+            np.array([p[0] for p in pending], dtype=np.int64),
+            np.array([p[1] for p in pending], dtype=np.float64),
+            np.array([len(p[2]) for p in pending], dtype=np.uint32),
+            np.array([p[4] is not None for p in pending], dtype=np.uint8),
+        )
+        parts = [_STREAM_HEADER.pack(_STREAM_MAGIC, len(pending), len(dets), len(keys))]
+        parts += [c.tobytes() for c in frame_cols]
+        parts += [np.ascontiguousarray(dets[name]).tobytes() for name, _ in _STREAM_DET_COLS]
+        parts.append(keys)
+        return b"".join(parts)
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self.flush()
+            self._fh.close()
+            self._fh = None
+
+
+# Per-process state for --workers mode (populated by _shard_worker_init in each child).
+_SHARD_STATE: dict = {}
+
+
+def _pin_worker_cores(worker_idx: int, threads: int) -> Optional[List[int]]:
+    """Bind this process to a disjoint slice of the allowed cores (Linux only)."""
+    if not hasattr(os, "sched_getaffinity"):
+        return None
+    cores = sorted(os.sched_getaffinity(0))
+    start = worker_idx * threads
+    if start + threads > len(cores):
+        return None
+    mine = cores[start : start + threads]
+    os.sched_setaffinity(0, mine)
+    return mine
+
+
+def _shard_worker_init(
+    onnx_path: str, img_size: Tuple[int, int], threads: int, counter, session_kwargs: dict, kwargs: dict
+) -> None:
+    with counter.get_lock():
+        worker_idx = counter.value
+        counter.value += 1
+    cv2.setNumThreads(1)
+    _pin_worker_cores(worker_idx, threads)
+    session, session_info = load_session(onnx_path, img_size, **{**session_kwargs, "intra_op_threads": threads})
+    _SHARD_STATE.update(session=session, session_info=session_info, img_size=img_size, kwargs=kwargs)
+
+
+def _shard_worker_run(chunk: List[Path]):
+    st = _SHARD_STATE
+    return list(_process_images(st["session"], st["session_info"], chunk, img_size=st["img_size"], **st["kwargs"]))
+
+
+def _run_images_sharded(
+    onnx_path: str,
+    images: List[Path],
+    img_size: Tuple[int, int],
+    workers: int,
+    chunk_size: int,
+    session_kwargs: Optional[dict] = None,
+    **kwargs,
+):
+    """
+    Fan image chunks out to a process pool; each worker owns one session with pinned intra-op threads.
+    images may be a lazy iterable; it is chunked as the pool consumes it.
+    """
+    import multiprocessing as mp
+
+    session_kwargs = dict(session_kwargs or {})
+    # An explicit --intra-op-threads wins; otherwise split the cores evenly across workers.
+    threads = session_kwargs.pop("intra_op_threads", None) or max(1, (os.cpu_count() or 1) // workers)
+    what = f"{len(images)} images" if isinstance(images, list) else "images"
+    print(f"[INFO] Sharding {what} over {workers} workers ({threads} intra-op threads each).")
+    # One decode + one encode thread per worker so workers x threads stays within the core budget.
+    kwargs.update(read_workers=1, write_workers=1)
+    counter = mp.Value("i", 0)
+    it = iter(images)
+    chunks = iter(lambda: list(islice(it, chunk_size)), [])
+    with mp.Pool(workers, initializer=_shard_worker_init, initargs=(onnx_path, img_size, threads, counter, session_kwargs, kwargs)) as pool:
+        for results in pool.imap(_shard_worker_run, chunks):
+            yield from results
+
+
+def _nonempty(items: Iterable) -> Optional[Iterator]:
+    """items as an iterator, or None if it yields nothing (only the first item is drawn to find out)."""
+    it = iter(items)
+    for first in it:
+        return chain((first,), it)
+    return None
+
+
+def _numbered(paths: Iterable[Path], frame_ids: dict, skip: AbstractSet[str] = frozenset()) -> Iterator[Path]:
+    """Pass on the paths not in skip, recording each one's position in paths in frame_ids as it goes."""
+    for i, p in enumerate(paths):
+        if str(p) not in skip:
+            frame_ids[p] = i
+            yield p
+
+
+def run_images(
+    session: Optional[ort.InferenceSession],
+    session_info: Optional[dict],
     img_dir: Path,
     out_dir: Path,
     img_size: Tuple[int, int],
     conf_thresh: float,
     actual_size: bool,
+    batch_size: int = 1,
+    read_workers: int = 4,
+    write_workers: int = 4,
+    queue_depth: int = 16,
+    workers: int = 1,
+    onnx_path: Optional[str] = None,
+    manifest_path: Optional[Path] = None,
+    chunk_size: int = 64,
+    session_kwargs: Optional[dict] = None,
+    reduced_decode: bool = False,
+    nms_params: Optional[dict] = None,
+    fallback: Optional[FallbackPolicy] = None,
+    render: bool = True,
+    stream_path: Optional[Path] = None,
+    stream_flush: int = 64,
+    resume: bool = False,
+    cache: Optional[PredictionCache] = None,
+    recursive: bool = False,
+    index: Optional[ImageIndex] = None,
 ) -> None:
+    """
+    Run the image pipeline over img_dir, an image directory or a frame_store.py store. workers > 1
+    shards the files across processes (each loading onnx_path); stream_path appends a DetectionStream,
+    cache reuses raw outputs of seen images and an ImageIndex limits the run to new or changed files.
+    """
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    exts = {".jpg", ".jpeg", ".png", ".bmp"}
-    images = [p for p in img_dir.iterdir() if p.suffix.lower() in exts]
-    if not images:
-        print(f"No images found under {img_dir}")
-        return
+    store = None
+    if is_frame_store(img_dir):
+        store = FrameStore(img_dir)
+        images = [Path(store.label(i)) for i in range(len(store))]
+        print(f"[INFO] Reading {len(store)} preprocessed frames from store {img_dir}")
+        if index is not None:
+            print("[WARN] --index is not used with frame stores.")
+            index = None
+    elif index is None:
+        images = scan_images(img_dir, recursive)
+    else:
+        images = index.pending(scan_image_entries(img_dir, recursive))
+    if index is None:
+        # the listing is consumed as the pipeline runs, not collected up front
+        images = _nonempty(images)
+        if images is None:
+            print(f"No images found under {img_dir}")
+            return
+
+    if index is not None:
+        # before the outputs are opened: cut off rows written after the last commit of a crashed run
+        index.track_outputs([stream_path, manifest_path])
+    stream = None
+    if stream_path is not None:
+        stream = DetectionStream(stream_path, stream_flush, resume or index is not None, scan=index is None)
+    frame_ids, next_frame = None, 0
+    if index is not None:
+        next_frame = max(index.next_frame, stream.next_frame if stream is not None else 0)
+    else:
+        # frame = position in the sorted listing, recorded as each image is handed out
+        frame_ids = {}
+        done_keys = stream.done_keys if stream is not None else frozenset()
+        if done_keys:
+            print(f"[INFO] Resuming {stream_path}: skipping the {len(done_keys)} images already streamed.")
+        images = _nonempty(_numbered(images, frame_ids, done_keys))
+        if images is None:
+            if stream is not None:
+                stream.close()
+            return
+
+    common = dict(
+        out_dir=out_dir,
+        conf_thresh=conf_thresh,
+        actual_size=actual_size,
+        batch_size=batch_size,
+        queue_depth=queue_depth,
+        reduced_decode=reduced_decode,
+        nms_params=nms_params,
+        fallback=fallback,
+        render=render,
+    )
+    if cache is not None:
+        common["cache"] = cache
+    if recursive and store is None:
+        common["root"] = img_dir
+    if store is not None:
+        if cache is not None:
+            print("[WARN] --cache is not used with frame stores (they are already preprocessed).")
+            cache = None
+        if workers > 1:
+            print("[WARN] Frame stores are read in one process; --workers ignored (use --batch-size / --intra-op-threads).")
+        results = _process_store(
+            session,
+            session_info,
+            store,
+            [frame_ids[p] for p in images],
+            write_workers=write_workers,
+            img_size=img_size,
+            **{k: v for k, v in common.items() if k not in ("reduced_decode", "cache")},
+        )
+    elif workers > 1:
+        if onnx_path is None:
+            raise ValueError("onnx_path is required when workers > 1")
+        if manifest_path is None and stream is None:
+            manifest_path = out_dir / "detections.jsonl"
+            if index is not None:
+                index.track_outputs([manifest_path])
+        results = _run_images_sharded(
+            onnx_path, images, img_size, workers, max(1, int(chunk_size)), session_kwargs=session_kwargs, **common
+        )
+    else:
+        results = _process_images(
+            session, session_info, images, img_size=img_size, read_workers=read_workers, write_workers=write_workers, **common
+        )
 
-    for img_path in images:
-        img_bgr = cv2.imread(str(img_path), cv2.IMREAD_COLOR)
-        if img_bgr is None:
-            print(f"Skip unreadable file: {img_path}")
-            continue
-        h, w = img_bgr.shape[:2]
-        target_h, target_w = img_size if actual_size else (h, w)
-        inp = preprocess(img_bgr, img_size)
-        dets = run_and_decode(session, session_info, inp, conf_thresh)
-        boxes = postprocess(dets, (target_h, target_w), conf_thresh)
-        if not boxes and dets.size > 0 and conf_thresh > 0.05:
-            fallback_thresh = max(0.05, conf_thresh * 0.5)
-            boxes = postprocess(dets, (target_h, target_w), fallback_thresh)
-        base = cv2.resize(img_bgr, (target_w, target_h)) if actual_size else img_bgr
-        vis_out = draw_boxes(base, boxes, (0, 0, 255))
-        save_path = out_dir / img_path.name
-        cv2.imwrite(str(save_path), vis_out)
-        print(f"Saved {save_path} (detections: {len(boxes)})")
+    manifest = None
+    if manifest_path is not None:
+        manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        manifest = open(manifest_path, "a" if index is not None else "w", encoding="utf-8")
+    try:
+        for img_path, save_path, boxes, report in results:
+            if frame_ids is not None:
+                frame = frame_ids.pop(img_path)
+            else:
+                frame, next_frame = next_frame, next_frame + 1
+            if boxes is None:
+                print(f"Skip unreadable file: {img_path}")
+            else:
+                label = f"Saved {save_path}" if save_path is not None else f"Processed {img_path}"
+                note = f", fallback {report['policy']} >= {report['thresh']:g}" if report is not None else ""
+                print(f"{label} (detections: {len(boxes)}{note})")
+                if stream is not None:
+                    stream.append(frame, time.time(), boxes, str(img_path), report)
+            if manifest is not None:
+                manifest.write(json.dumps(_manifest_record(img_path, boxes, report)) + "\n")
+            if index is not None:
+                index.mark_done(img_path, frame if boxes is not None else None)
+                if index.uncommitted >= max(1, int(stream_flush)):
+                    # outputs first, so a committed file is never missing from them; the index records
+                    # their flushed sizes, so rows for uncommitted files are cut off on the next run
+                    if stream is not None:
+                        stream.flush()
+                    if manifest is not None:
+                        manifest.flush()
+                    index.commit()
+    finally:
+        if manifest is not None:
+            manifest.close()
+            print(f"Wrote detection manifest to {manifest_path}")
+        if stream is not None:
+            stream.close()
+            print(f"Streamed detections for {stream.written} images to {stream_path}")
+        if index is not None:
+            index.commit()
+            print(f"[INFO] Index {index.path}: {index.committed} new or changed files processed, {index.skipped} unchanged skipped.")
+        if cache is not None:
+            print(f"[INFO] Prediction cache {cache.path}: {cache.summary()}")
+
+
+_LATENCY_STAGES = ("capture", "queue", "preprocess", "infer", "decode", "postprocess", "present", "e2e")
+_LATENCY_STAMPS = ("read_start", "capture", "pre_start", "pre_end", "infer_end", "decode_end", "post_end", "present")
+# (stage, start timestamp key, end timestamp key)
+_LATENCY_SPANS = (
+    ("capture", "read_start", "capture"),
+    ("queue", "capture", "pre_start"),
+    ("preprocess", "pre_start", "pre_end"),
+    ("infer", "pre_end", "infer_end"),
+    ("decode", "infer_end", "decode_end"),
+    ("postprocess", "decode_end", "post_end"),
+    ("present", "post_end", "present"),
+    ("e2e", "read_start", "present"),
+)
+
+
+class LatencyTracker:
+    """
+    Rolling per-stage latency from per-frame perf_counter timestamps
+    (read_start, capture, pre_start, pre_end, infer_end, decode_end, post_end, present).
+    read_start is taken before the blocking cap.read(), so e2e includes the wait on the device.
+    Optionally appends every frame to a CSV or JSONL log (chosen by file suffix).
+    """
+
+    def __init__(self, window: int = 300, log_path: Optional[Path] = None) -> None:
+        self._samples = {name: deque(maxlen=max(1, int(window))) for name in _LATENCY_STAGES}
+        self._t_origin = time.perf_counter()
+        self._log = None
+        self._log_csv = False
+        if log_path is not None:
+            log_path.parent.mkdir(parents=True, exist_ok=True)
+            self._log_csv = log_path.suffix.lower() == ".csv"
+            self._log = open(log_path, "w", encoding="utf-8", newline="")
+            if self._log_csv:
+                ts_cols = [f"t_{k}_ms" for k in _LATENCY_STAMPS]
+                self._log.write(",".join(["frame", *ts_cols, *[f"{n}_ms" for n in _LATENCY_STAGES]]) + "\n")
+
+    def record(self, frame_idx: int, ts: dict) -> dict:
+        stages = {name: (ts[end] - ts[start]) * 1000.0 for name, start, end in _LATENCY_SPANS}
+        for name, ms in stages.items():
+            self._samples[name].append(ms)
+        if self._log is not None:
+            rel = {k: (v - self._t_origin) * 1000.0 for k, v in ts.items()}
+            if self._log_csv:
+                ts_vals = [rel[k] for k in _LATENCY_STAMPS]
+                row = [str(frame_idx), *[f"{v:.3f}" for v in ts_vals], *[f"{stages[n]:.3f}" for n in _LATENCY_STAGES]]
+                self._log.write(",".join(row) + "\n")
+            else:
+                rec = {"frame": frame_idx, "t_ms": {k: round(v, 3) for k, v in rel.items()}}
+                rec.update({f"{n}_ms": round(stages[n], 3) for n in _LATENCY_STAGES})
+                self._log.write(json.dumps(rec) + "\n")
+        return stages
+
+    def percentiles(self) -> dict:
+        """{stage: (p50, p95, p99)} in ms over the rolling window."""
+        out = {}
+        for name in _LATENCY_STAGES:
+            vals = self._samples[name]
+            if vals:
+                p50, p95, p99 = np.percentile(np.fromiter(vals, dtype=np.float64), (50, 95, 99))
+                out[name] = (float(p50), float(p95), float(p99))
+        return out
+
+    def summary_lines(self) -> List[str]:
+        lines = [f"{'stage':<12}{'p50':>6} {'p95':>6} {'p99':>6} ms"]
+        for name, (p50, p95, p99) in self.percentiles().items():
+            lines.append(f"{name:<12}{p50:6.2f} {p95:6.2f} {p99:6.2f}")
+        return lines
+
+    def close(self) -> None:
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+def _draw_text_block(vis: np.ndarray, lines: List[str]) -> None:
+    """Draw left-aligned text lines on a black box in the top-left corner."""
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    font_scale = 0.5
+    thickness = 1
+    pad = 6
+    x, y = 10, 10
+    sizes = [cv2.getTextSize(line, font, font_scale, thickness) for line in lines]
+    line_h = max(th + baseline for (_, th), baseline in sizes) + 4
+    box_w = max(tw for (tw, _), _ in sizes)
+    cv2.rectangle(vis, (x - pad, y - pad), (x + box_w + pad, y + line_h * len(lines) + pad), (0, 0, 0), thickness=-1)
+    for i, line in enumerate(lines):
+        cv2.putText(vis, line, (x, y + line_h * (i + 1) - 4), font, font_scale, (0, 0, 255), thickness, cv2.LINE_AA)
+
+
+class _LatestSlot:
+    """Single-item mailbox between pipeline threads: put() replaces any unread item, get() takes the newest."""
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item) -> None:
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self._cond.notify_all()
+
+    def get(self, timeout: Optional[float] = None):
+        """Return the newest item, or None on timeout / once closed and empty."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._item is not None or self._closed, timeout)
+            item, self._item = self._item, None
+            return item
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        with self._cond:
+            return self._closed and self._item is None
+
+
+def _camera_capture_loop(cap: cv2.VideoCapture, slot: _LatestSlot, stop: threading.Event) -> None:
+    # this thread owns the capture: releasing it anywhere else could race a cap.read() still blocked on the device
+    frame_idx = 0
+    try:
+        while not stop.is_set():
+            read_start = time.perf_counter()
+            with _span("capture", "io"):
+                ret, frame = cap.read()
+            if not ret:
+                break
+            slot.put((frame_idx, frame, {"read_start": read_start, "capture": time.perf_counter()}))
+            frame_idx += 1
+    finally:
+        slot.close()
+        cap.release()
+
+
+def _camera_infer_loop(
+    session: ort.InferenceSession,
+    session_info: dict,
+    img_size: Tuple[int, int],
+    conf_thresh: float,
+    actual_size: bool,
+    frames: _LatestSlot,
+    results: _LatestSlot,
+    stop: threading.Event,
+    nms_params: Optional[dict] = None,
+    fallback: Optional[FallbackPolicy] = None,
+) -> None:
+    runner = BoundRunner(session, session_info, img_size, batch_size=1)
+    try:
+        while not stop.is_set():
+            item = frames.get(timeout=0.1)
+            if item is None:
+                if frames.closed:
+                    break
+                continue
+            frame_idx, frame, ts = item
+            ts["pre_start"] = time.perf_counter()
+            h, w = frame.shape[:2]
+            target_h, target_w = img_size if actual_size else (h, w)
+            runner.load_frame(0, frame)
+            ts["pre_end"] = time.perf_counter()
+            run_outs = runner.infer(1)
+            ts["infer_end"] = time.perf_counter()
+            dets = runner.decode(run_outs, conf_thresh, fallback)[0]
+            ts["decode_end"] = time.perf_counter()
+            boxes, report = select_detections(dets, (target_h, target_w), conf_thresh, nms_params, fallback)
+            ts["post_end"] = time.perf_counter()
+            results.put((frame_idx, frame, boxes, report, ts))
+    finally:
+        results.close()
 
 
 def run_camera(
@@ -409,79 +2244,515 @@ def run_camera(
     conf_thresh: float,
     record_path: Optional[Path] = None,
     actual_size: bool = False,
+    latency_log: Optional[Path] = None,
+    latency_window: int = 300,
+    nms_params: Optional[dict] = None,
+    fallback: Optional[FallbackPolicy] = None,
+    render: bool = True,
+    stream_path: Optional[Path] = None,
+    stream_flush: int = 64,
+    resume: bool = False,
 ) -> None:
+    """
+    Capture, inference and presentation run on separate threads joined by latest-frame slots.
+    Inference always takes the newest captured frame, so a slow stage drops stale frames instead
+    of queueing them; the drop count is shown on the overlay and printed at exit.
+    Each presented frame carries capture -> present timestamps; rolling p50/p95/p99 per stage are
+    drawn on the overlay and, if latency_log is set, every frame is logged as CSV or JSONL.
+    With stream_path, detections are appended to a DetectionStream (wall-clock timestamps; frame ids
+    continue after an existing stream when resuming). render=False skips drawing, display and
+    recording; stop with Ctrl+C.
+    """
     cap = cv2.VideoCapture(camera_id)
     if not cap.isOpened():
         raise RuntimeError(f"Failed to open camera id {camera_id}")
 
+    # read before the capture thread takes ownership of cap
+    record_fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    if record_fps <= 0:
+        record_fps = 30.0
+
+    frames = _LatestSlot()
+    results = _LatestSlot()
+    stop = threading.Event()
+    workers = [
+        threading.Thread(target=_camera_capture_loop, args=(cap, frames, stop), name="uhd-capture", daemon=True),
+        threading.Thread(
+            target=_camera_infer_loop,
+            args=(session, session_info, img_size, conf_thresh, actual_size, frames, results, stop, nms_params, fallback),
+            name="uhd-infer",
+            daemon=True,
+        ),
+    ]
+    for t in workers:
+        t.start()
+
     writer = None
-    last_time = None
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        t0 = time.perf_counter()
-        h, w = frame.shape[:2]
-        target_h, target_w = img_size if actual_size else (h, w)
-        inp = preprocess(frame, img_size)
-        dets = run_and_decode(session, session_info, inp, conf_thresh)
-        boxes = postprocess(dets, (target_h, target_w), conf_thresh)
-        if not boxes and dets.size > 0 and conf_thresh > 0.05:
-            fallback_thresh = max(0.05, conf_thresh * 0.5)
-            boxes = postprocess(dets, (target_h, target_w), fallback_thresh)
-        base = cv2.resize(frame, (target_w, target_h)) if actual_size else frame
-        vis = draw_boxes(base, boxes, (255, 0, 0))
+    shown = 0
+    fallback_frames = 0
+    tracker = LatencyTracker(latency_window, latency_log)
+    stream = DetectionStream(stream_path, stream_flush, resume) if stream_path is not None else None
+    frame_base = stream.next_frame if stream is not None else 0
+    overlay_lines: List[str] = []
+    try:
+        while True:
+            item = results.get(timeout=0.1)
+            if item is None:
+                if results.closed:
+                    break
+                # keep the window responsive while waiting for the next result
+                if render and cv2.waitKey(1) & 0xFF == ord("q"):
+                    break
+                continue
+            frame_idx, frame, boxes, report, ts = item
+            fallback_frames += report is not None
+            if stream is not None:
+                stream.append(frame_base + frame_idx, time.time(), boxes, fallback=report)
+            if not render:
+                shown += 1
+                ts["present"] = time.perf_counter()
+                tracker.record(frame_idx, ts)
+                continue
+            h, w = frame.shape[:2]
+            target_h, target_w = img_size if actual_size else (h, w)
+            base = cv2.resize(frame, (target_w, target_h)) if actual_size else frame
+            with _span("draw"):
+                vis = draw_boxes(base, boxes, (255, 0, 0))
+
+            if not actual_size:
+                # percentiles are refreshed periodically; the overlay lags the current frame by design
+                if shown % 15 == 0:
+                    overlay_lines = tracker.summary_lines() + [f"dropped {frames.dropped}"]
+                fb_line = [f"fallback {report['policy']} >= {report['thresh']:g}"] if report is not None else []
+                _draw_text_block(vis, overlay_lines + fb_line)
+
+            vis_out = cv2.resize(vis, img_size) if actual_size else vis
+
+            if record_path:
+                if writer is None:
+                    h, w = vis_out.shape[:2]
+                    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+                    record_path.parent.mkdir(parents=True, exist_ok=True)
+                    writer = cv2.VideoWriter(str(record_path), fourcc, record_fps, (w, h))
+                writer.write(vis_out)
+
+            shown += 1
+            with _span("present", "io"):
+                cv2.imshow("UHD ONNX (press q to quit)", vis_out)
+                key = cv2.waitKey(1) & 0xFF
+            ts["present"] = time.perf_counter()
+            tracker.record(frame_idx, ts)
+            if key == ord("q"):
+                break
+    except KeyboardInterrupt:
+        if render:
+            raise
+    finally:
+        stop.set()
+        for t in workers:
+            t.join(timeout=2.0)
+        if workers[0].is_alive():
+            print("[WARN] Capture thread still blocked on the camera; it releases the device when the read returns.")
+        if writer is not None:
+            writer.release()
+            print(f"Saved recording to {record_path}")
+        if render:
+            cv2.destroyAllWindows()
+        tracker.close()
+        if stream is not None:
+            stream.close()
+            print(f"Streamed detections for {stream.written} frames to {stream_path}")
+    print(f"[INFO] {'Presented' if render else 'Processed'} {shown} frames; dropped {frames.dropped} stale captures, {results.dropped} stale results.")
+    print(f"[INFO] Fallback ({(fallback or DEFAULT_FALLBACK).describe()}) fired on {fallback_frames}/{shown} frames.")
+    for line in tracker.summary_lines():
+        print(f"[LATENCY] {line}")
+    if latency_log is not None:
+        print(f"Saved latency log to {latency_log}")
+
+
+_VIDEO_DONE = object()
+
+
+def _video_decode_loop(
+    cap: cv2.VideoCapture,
+    out_q: "queue.Queue",
+    stop: threading.Event,
+    start_frame: int,
+    stride: int,
+    end_frame: Optional[int],
+) -> None:
+    """Decode every stride-th frame into out_q; skipped frames are only grabbed, never retrieved."""
+    frame_idx = start_frame
+    try:
+        while not stop.is_set() and (end_frame is None or frame_idx < end_frame):
+            if (frame_idx - start_frame) % stride == 0:
+                with _span("read", "io"):
+                    ret, frame = cap.read()
+                if not ret:
+                    break
+                out_q.put((frame_idx, frame))
+            elif not cap.grab():
+                break
+            frame_idx += 1
+    finally:
+        out_q.put(_VIDEO_DONE)
+
+
+def run_video(
+    session: ort.InferenceSession,
+    session_info: dict,
+    video_path: Path,
+    img_size: Tuple[int, int],
+    conf_thresh: float,
+    log_path: Path,
+    actual_size: bool = False,
+    batch_size: int = 1,
+    stride: int = 1,
+    start_sec: float = 0.0,
+    end_sec: Optional[float] = None,
+    queue_depth: int = 16,
+    nms_params: Optional[dict] = None,
+    fallback: Optional[FallbackPolicy] = None,
+    stream_flush: int = 64,
+    resume: bool = False,
+) -> None:
+    """
+    Offline video pass: frames are decoded on a background thread and inferred as fast as the CPU
+    allows (no pacing, no display). Every stride-th frame in [start_sec, end_sec) is processed and
+    one record per frame (frame index, video time, detections) is appended to the DetectionStream at
+    log_path; resume=True continues after the last frame already in the log.
+    """
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise RuntimeError(f"Failed to open video {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    if fps <= 0:
+        fps = 30.0
+    stride = max(1, int(stride))
+    start_frame = 0
+    if start_sec > 0:
+        cap.set(cv2.CAP_PROP_POS_MSEC, start_sec * 1000.0)
+        start_frame = int(round(cap.get(cv2.CAP_PROP_POS_FRAMES)))
+    end_frame = int(np.ceil(end_sec * fps)) if end_sec is not None else None
+    stream = DetectionStream(log_path, stream_flush, resume)
+    if stream.next_frame > start_frame:
+        # keep the stride phase of the original run
+        start_frame += -(-(stream.next_frame - start_frame) // stride) * stride
+        print(f"[INFO] Resuming {log_path} at frame {start_frame}.")
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+    runner = BoundRunner(session, session_info, img_size, batch_size)
+    frame_q: "queue.Queue" = queue.Queue(maxsize=max(int(queue_depth), runner.batch_size))
+    stop = threading.Event()
+    decoder = threading.Thread(
+        target=_video_decode_loop,
+        args=(cap, frame_q, stop, start_frame, stride, end_frame),
+        name="uhd-video-decode",
+        daemon=True,
+    )
+    processed = 0
+    fallback_frames = 0
+    t0 = time.perf_counter()
+    decoder.start()
+    try:
+        done = False
+        while not done:
+            batch = []
+            while len(batch) < runner.batch_size:
+                item = frame_q.get()
+                if item is _VIDEO_DONE:
+                    done = True
+                    break
+                runner.load_frame(len(batch), item[1])
+                batch.append(item)
+            if not batch:
+                break
+            dets = runner.run(len(batch), conf_thresh, fallback)
+            targets = [img_size if actual_size else frame.shape[:2] for _, frame in batch]
+            selected = select_detections_batch(dets, targets, conf_thresh, nms_params, fallback)
+            for (frame_idx, _), (boxes, report) in zip(batch, selected):
+                stream.append(frame_idx, frame_idx / fps, boxes, fallback=report)
+                fallback_frames += report is not None
+            processed += len(batch)
+    finally:
+        stop.set()
+        stream.close()
+        # Unblock the decoder if it is waiting on a full queue.
+        while decoder.is_alive():
+            try:
+                frame_q.get_nowait()
+            except queue.Empty:
+                decoder.join(timeout=0.05)
+        cap.release()
+    elapsed = time.perf_counter() - t0
+    print(
+        f"[INFO] Processed {processed} frames (stride {stride}) in {elapsed:.2f}s "
+        f"({processed / max(elapsed, 1e-9):.1f} fps); fallback fired on {fallback_frames}."
+    )
+    print(f"Wrote detection log to {log_path}")
+
+
+def start_profile_trace() -> TraceRecorder:
+    """Start recording Python-side pipeline spans (preprocess, infer, decode, postprocess, nms, draw, I/O)."""
+    global _TRACER
+    _TRACER = TraceRecorder()
+    return _TRACER
 
+
+def write_profile_trace(trace_path: Path, session: Optional[ort.InferenceSession] = None) -> Path:
+    """
+    Stop span recording and write one Chrome-trace / Perfetto JSON: the Python spans plus, when the
+    session was loaded with profile_prefix, onnxruntime's per-operator profile shifted onto the same
+    wall clock. Timestamps are rebased so the trace starts at 0.
+    """
+    global _TRACER
+    tracer, _TRACER = _TRACER, None
+    events = tracer.events() if tracer is not None else []
+    if session is not None and session.get_session_options().enable_profiling:
+        ort_path = Path(session.end_profiling())
+        offset_us = session.get_profiling_start_time_ns() / 1000.0
+        for ev in json.loads(ort_path.read_text(encoding="utf-8")):
+            if "ts" in ev:
+                ev["ts"] = ev["ts"] + offset_us
+            events.append(ev)
+        print(f"[INFO] Merged onnxruntime profile {ort_path}")
+    timed = [ev["ts"] for ev in events if "ts" in ev]
+    base = min(timed) if timed else 0.0
+    for ev in events:
+        if "ts" in ev:
+            ev["ts"] = round(ev["ts"] - base, 3)
+            if "dur" in ev:
+                ev["dur"] = round(ev["dur"], 3)
+    events.insert(0, {"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": "demo.py"}})
+    trace_path.parent.mkdir(parents=True, exist_ok=True)
+    trace_path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}), encoding="utf-8")
+    print(f"Wrote profile trace ({len(events)} events) to {trace_path}")
+    return trace_path
+
+
+_BENCH_STAGES = ("preprocess", "infer", "decode", "postprocess", "draw", "total")
+
+
+def load_benchmark_frames(
+    source: Optional[Path],
+    count: int = 16,
+    resolution: Tuple[int, int] = (480, 640),
+    seed: int = 0,
+    recursive: bool = False,
+) -> Union[List[np.ndarray], FrameStore]:
+    """
+    Up to `count` BGR frames: the first readable images under `source` (found by scan_images, in the
+    same order as image mode), or seeded random frames of HxW resolution. A frame store source is
+    returned as-is and cycled in full.
+    """
+    if source is not None and is_frame_store(source):
+        return FrameStore(source)
+    if source is not None:
+        frames = []
+        for p in scan_images(Path(source), recursive):
+            img = cv2.imread(str(p), cv2.IMREAD_COLOR)
+            if img is not None:
+                frames.append(img)
+            if len(frames) >= count:
+                break
+        if not frames:
+            raise RuntimeError(f"No readable images found under {source}")
+        return frames
+    rng = np.random.default_rng(seed)
+    h, w = resolution
+    return [rng.integers(0, 256, size=(h, w, 3), dtype=np.uint8) for _ in range(max(1, int(count)))]
+
+
+def run_benchmark(
+    session: ort.InferenceSession,
+    session_info: dict,
+    img_size: Tuple[int, int],
+    conf_thresh: float,
+    frames: Union[List[np.ndarray], FrameStore],
+    iters: int = 200,
+    warmup: int = 20,
+    batch_size: int = 1,
+    actual_size: bool = False,
+    nms_params: Optional[dict] = None,
+    fallback: Optional[FallbackPolicy] = None,
+) -> dict:
+    """
+    Time each pipeline stage separately over `iters` batches (after `warmup` untimed ones), cycling
+    through `frames`. Stages: preprocess (into the bound input), infer (session run), decode (raw
+    output -> [N, 6]), postprocess (threshold, fallback, NMS), draw (draw_boxes) and their total.
+    With a FrameStore, preprocess is the uint8 -> float conversion of the mapped frames (no resize),
+    boxes are scaled to the stored original sizes and drawn on BGR copies of the stored frames.
+    Returns {stage: per-batch milliseconds as a float64 array}.
+    """
+    runner = BoundRunner(session, session_info, img_size, batch_size)
+    n = runner.batch_size
+    store = frames if isinstance(frames, FrameStore) else None
+    if store is not None and tuple(store.img_size) != tuple(img_size):
+        raise ValueError(f"Frame store {store.path} holds {store.img_size} frames but the model input is {img_size}")
+    samples = {name: np.empty(max(1, int(iters)), dtype=np.float64) for name in _BENCH_STAGES}
+    cursor = 0
+    for it in range(max(0, int(warmup)) + max(1, int(iters))):
+        idx = [(cursor + j) % len(frames) for j in range(n)]
+        cursor += n
+        if store is None:
+            batch = [frames[i] for i in idx]
+            targets = [frame.shape[:2] for frame in batch]
+        else:
+            targets = [tuple(store.orig_hw[i]) for i in idx]
+        t0 = time.perf_counter()
+        if store is None:
+            for j, frame in enumerate(batch):
+                runner.load_frame(j, frame)
+        elif idx[-1] - idx[0] == n - 1:
+            frames_to_input(store.frames[idx[0] : idx[-1] + 1], runner.input[:n])
+        else:
+            frames_to_input(store.frames[idx], runner.input[:n])
         t1 = time.perf_counter()
-        ms = (t1 - t0) * 1000.0
-        last_time = t1
-        if not actual_size:
-            label = f"{ms:.2f} ms"
-            font = cv2.FONT_HERSHEY_SIMPLEX
-            font_scale = 0.8
-            thickness = 2
-            (tw, th), baseline = cv2.getTextSize(label, font, font_scale, thickness)
-            pad = 6
-            x, y = 10, 30
-            cv2.rectangle(
-                vis,
-                (x - pad, y - th - pad),
-                (x + tw + pad, y + baseline + pad),
-                (0, 0, 0),
-                thickness=-1,
-            )
-            cv2.putText(
-                vis,
-                label,
-                (x, y),
-                font,
-                font_scale,
-                (0, 0, 255),
-                thickness,
-                cv2.LINE_AA,
-            )
+        run_outs = runner.infer(n)
+        t2 = time.perf_counter()
+        dets = runner.decode(run_outs, conf_thresh, fallback)
+        t3 = time.perf_counter()
+        hws = [img_size if actual_size else hw for hw in targets]
+        boxes = [b for b, _ in select_detections_batch(dets, hws, conf_thresh, nms_params, fallback)]
+        draw = boxes
+        if store is not None:
+            # the map is read-only; copies (and rescaling to the stored size) stay outside the timed stages
+            batch = [np.ascontiguousarray(store.frames[i][:, :, ::-1]) for i in idx]
+            if not actual_size:
+                sh, sw = store.img_size
+                draw = [scale_boxes(b, sw / hw[1], sh / hw[0]) for b, hw in zip(boxes, targets)]
+        t4 = time.perf_counter()
+        for frame, b in zip(batch, draw):
+            draw_boxes(frame, b, (0, 0, 255))
+        t5 = time.perf_counter()
+        i = it - int(warmup)
+        if i < 0:
+            continue
+        for name, (a, b) in zip(_BENCH_STAGES, ((t0, t1), (t1, t2), (t2, t3), (t3, t4), (t4, t5), (t0, t5))):
+            samples[name][i] = (b - a) * 1000.0
+    return samples
+
+
+def summarize_benchmark(samples: dict, batch_size: int = 1) -> dict:
+    """{stage: {mean_ms, p50_ms, p95_ms, p99_ms, fps}} from run_benchmark samples (fps counts frames, not batches)."""
+    out = {}
+    for name in _BENCH_STAGES:
+        vals = samples[name]
+        p50, p95, p99 = np.percentile(vals, (50, 95, 99))
+        mean = float(vals.mean())
+        out[name] = {
+            "mean_ms": round(mean, 4),
+            "p50_ms": round(float(p50), 4),
+            "p95_ms": round(float(p95), 4),
+            "p99_ms": round(float(p99), 4),
+            "fps": round(batch_size * 1000.0 / mean, 2) if mean > 0 else None,
+        }
+    return out
 
-        vis_out = cv2.resize(vis, img_size) if actual_size else vis
-
-        if record_path:
-            if writer is None:
-                h, w = vis_out.shape[:2]
-                fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
-                if fps <= 0:
-                    fps = 30.0
-                fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-                record_path.parent.mkdir(parents=True, exist_ok=True)
-                writer = cv2.VideoWriter(str(record_path), fourcc, fps, (w, h))
-            writer.write(vis_out)
-
-        cv2.imshow("UHD ONNX (press q to quit)", vis_out)
-        if cv2.waitKey(1) & 0xFF == ord("q"):
-            break
-    if writer is not None:
-        writer.release()
-        print(f"Saved recording to {record_path}")
-    cap.release()
-    cv2.destroyAllWindows()
+
+def benchmark_lines(stages: dict) -> List[str]:
+    lines = [f"{'stage':<12}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'fps':>10}   (ms)"]
+    for name, st in stages.items():
+        fps = f"{st['fps']:10.1f}" if st["fps"] is not None else f"{'-':>10}"
+        lines.append(
+            f"{name:<12}{st['mean_ms']:9.3f}{st['p50_ms']:9.3f}{st['p95_ms']:9.3f}{st['p99_ms']:9.3f}{fps}"
+        )
+    return lines
+
+
+# Bump when the benchmark record layout changes incompatibly; compare refuses mixed schemas.
+BENCH_RECORD_SCHEMA = 1
+
+
+def _cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as fh:
+            for line in fh:
+                if line.lower().startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def benchmark_host() -> dict:
+    return {
+        "cpu_model": _cpu_model(),
+        "cpu_count": os.cpu_count(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "onnxruntime": ort.__version__,
+    }
+
+
+def save_benchmark_record(report: dict, history_dir: Path) -> Path:
+    """Store a benchmark report as '<timestamp>_<variant>_<sha8>_b<batch>.json' in history_dir."""
+    history_dir.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.localtime())
+    sha = (report.get("model_sha256") or "nohash")[:8]
+    variant = re.sub(r"[^A-Za-z0-9._-]+", "-", str(report.get("variant") or "model"))
+    stem = f"{stamp}_{variant}_{sha}_b{report.get('batch_size', 1)}"
+    path = history_dir / f"{stem}.json"
+    n = 1
+    while path.exists():
+        path = history_dir / f"{stem}.{n}.json"
+        n += 1
+    path.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    return path
+
+
+def find_baseline(history_dir: Path, report: dict, exclude: Optional[Path] = None) -> Optional[Path]:
+    """Newest stored record with the same schema, model hash, variant, input size and batch size."""
+    key = ("schema", "model_sha256", "variant", "img_size", "batch_size")
+    best = None
+    for path in sorted(Path(history_dir).glob("*.json")):
+        if exclude is not None and path.resolve() == Path(exclude).resolve():
+            continue
+        try:
+            rec = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if all(rec.get(k) == report.get(k) for k in key) and (best is None or rec.get("created", "") >= best[0]):
+            best = (rec.get("created", ""), path)
+    return best[1] if best else None
+
+
+def compare_benchmarks(
+    run: dict,
+    baseline: dict,
+    max_latency_regress_pct: float = 10.0,
+    max_fps_drop_pct: float = 10.0,
+    percentile: str = "p95",
+    stages: Optional[List[str]] = None,
+    min_delta_ms: float = 0.05,
+) -> Tuple[List[str], bool]:
+    """
+    Diff per-stage latency (`percentile`: p50/p95/p99/mean) and FPS of run against baseline. A stage
+    regresses when its latency grows by more than max_latency_regress_pct or its FPS drops by more than
+    max_fps_drop_pct; changes under min_delta_ms are treated as timer noise. Returns (lines, ok).
+    """
+    if run.get("schema") != baseline.get("schema"):
+        return [f"schema mismatch: run {run.get('schema')} vs baseline {baseline.get('schema')}"], False
+    lat_key = f"{percentile}_ms"
+    names = stages or list(run["stages"])
+    lines = [f"{'stage':<12}{'base ' + percentile:>11}{'run ' + percentile:>11}{'delta':>9}{'base fps':>11}{'run fps':>11}{'delta':>9}"]
+    ok = True
+    for name in names:
+        r, b = run["stages"].get(name), baseline["stages"].get(name)
+        if r is None or b is None:
+            lines.append(f"{name:<12}missing from {'run' if r is None else 'baseline'}")
+            ok = False
+            continue
+        lat_pct = (r[lat_key] - b[lat_key]) / b[lat_key] * 100.0 if b[lat_key] else 0.0
+        fps_pct = (r["fps"] - b["fps"]) / b["fps"] * 100.0 if b["fps"] and r["fps"] else 0.0
+        noisy = abs(r[lat_key] - b[lat_key]) < min_delta_ms and abs(r["mean_ms"] - b["mean_ms"]) < min_delta_ms
+        bad = not noisy and (lat_pct > max_latency_regress_pct or -fps_pct > max_fps_drop_pct)
+        ok &= not bad
+        lines.append(
+            f"{name:<12}{b[lat_key]:11.3f}{r[lat_key]:11.3f}{lat_pct:+8.1f}%"
+            f"{b['fps'] or 0:11.1f}{r['fps'] or 0:11.1f}{fps_pct:+8.1f}%{'  REGRESSION' if bad else ''}"
+        )
+    return lines, ok
 
 
 def parse_size(arg: str) -> Tuple[int, int]:
@@ -493,21 +2764,293 @@ def parse_size(arg: str) -> Tuple[int, int]:
     return v, v
 
 
+def parse_model_spec(spec: str, default_size: Tuple[int, int]) -> Tuple[str, str, Tuple[int, int]]:
+    """'NAME=PATH[@HxW]' -> (name, path, img_size)."""
+    name, sep, rest = spec.partition("=")
+    if not sep or not name or not rest:
+        raise ValueError(f"Model spec must be NAME=PATH[@HxW], got {spec!r}")
+    path, _, size = rest.partition("@")
+    return name, path, parse_size(size) if size else default_size
+
+
 def build_args():
     parser = argparse.ArgumentParser(description="UltraTinyOD ONNX demo (CPU).")
     mode = parser.add_mutually_exclusive_group(required=True)
-    mode.add_argument("--images", type=str, help="Directory with images to run batch inference.")
+    mode.add_argument("--images", type=str, help="Directory with images (or a frame_store.py store) to run batch inference.")
     mode.add_argument("--camera", type=int, help="USB camera id for realtime inference.")
+    mode.add_argument("--video", type=str, help="Video file to process offline (no display, no real-time pacing).")
+    mode.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="Time preprocess / infer / decode / postprocess / draw separately and report mean, p50/p95/p99 and FPS.",
+    )
+    mode.add_argument(
+        "--serve",
+        action="store_true",
+        help="Long-running local inference server (POST /detect) that micro-batches concurrent requests.",
+    )
     parser.add_argument("--onnx", required=True, help="Path to ONNX model (CPU).")
-    parser.add_argument("--output", type=str, default="demo_output", help="Output directory for image mode.")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="demo_output",
+        help="Output directory for image mode (and for the --no-render stream in camera mode).",
+    )
     parser.add_argument("--img-size", type=str, default="64x64", help="Input size HxW, e.g., 64x64.")
     parser.add_argument("--conf-thresh", type=float, default=0.30, help="Confidence threshold.")
+    parser.add_argument(
+        "--nms",
+        action="store_true",
+        help="Apply non-maximum suppression to the thresholded boxes (off by default: all boxes are kept).",
+    )
+    parser.add_argument("--nms-iou", type=float, default=0.45, help="With --nms: IoU threshold for suppression.")
+    parser.add_argument("--nms-class-agnostic", action="store_true", help="With --nms: suppress overlapping boxes across classes.")
+    parser.add_argument("--max-det", type=int, default=100, help="With --nms: maximum detections kept per image.")
+    parser.add_argument(
+        "--fallback",
+        choices=FallbackPolicy.MODES,
+        default="thresh",
+        help="Policy when too few boxes pass --conf-thresh: secondary threshold, top-up to --fallback-k, or none.",
+    )
+    parser.add_argument(
+        "--fallback-thresh",
+        type=float,
+        default=None,
+        help="Secondary threshold for --fallback (default: max(0.05, conf_thresh * 0.5)).",
+    )
+    parser.add_argument("--fallback-k", type=int, default=1, help="Minimum detections kept by --fallback topk.")
     parser.add_argument(
         "--record",
         type=str,
         default="camera_record.mp4",
         help="MP4 path for automatic recording when --camera is used.",
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="Number of images (or video frames) stacked into one [N,3,H,W] session.run in image/video mode.",
+    )
+    parser.add_argument("--read-workers", type=int, default=4, help="Image mode: threads decoding input images.")
+    parser.add_argument("--write-workers", type=int, default=4, help="Image mode: threads drawing/encoding outputs.")
+    parser.add_argument(
+        "--queue-depth",
+        type=int,
+        default=16,
+        help="Image/video mode: max frames buffered between pipeline stages (bounds memory use).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Image mode: shard the file list over N processes, each with its own session and pinned threads.",
+    )
+    parser.add_argument(
+        "--reduced-decode",
+        action="store_true",
+        help="Image mode: decode JPEGs at 1/2, 1/4 or 1/8 scale when that still covers --img-size "
+        "(annotated outputs are saved at the decoded size; manifest boxes stay in original pixels).",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        default=None,
+        help="Image mode: JSONL detection manifest path (defaults to <output>/detections.jsonl with --workers > 1). "
+        "Video mode: per-frame detection log (defaults to <output>/<video stem>.jsonl).",
+    )
+    parser.add_argument(
+        "--no-render",
+        action="store_true",
+        help="Skip drawing, image writing, display and recording; detections go to --stream "
+        "(image and camera modes default it to <output>/detections.jsonl).",
+    )
+    parser.add_argument(
+        "--stream",
+        type=str,
+        default=None,
+        help="Append detections with frame ids and timestamps to this file: JSONL, or binary columnar for "
+        ".uhdd/.bin (read back with read_detection_stream). Video mode uses it in place of --manifest.",
+    )
+    parser.add_argument("--stream-flush", type=int, default=64, help="Frames buffered per --stream write.")
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=None,
+        help=(
+            "Image mode: SQLite file caching raw model outputs by image content + model hash; re-runs with "
+            "other --conf-thresh / NMS / fallback / output settings skip inference for images already seen."
+        ),
+    )
+    parser.add_argument("--serve-host", type=str, default="127.0.0.1", help="Serve mode: address to bind.")
+    parser.add_argument("--serve-port", type=int, default=8765, help="Serve mode: TCP port (0 picks a free one).")
+    parser.add_argument(
+        "--serve-socket", type=str, default=None, help="Serve mode: listen on this Unix socket path instead of TCP."
+    )
+    parser.add_argument("--serve-max-batch", type=int, default=8, help="Serve mode: most requests per session run.")
+    parser.add_argument(
+        "--serve-max-delay-ms",
+        type=float,
+        default=2.0,
+        help="Serve mode: longest a request waits for others to join its batch.",
+    )
+    parser.add_argument(
+        "--model",
+        action="append",
+        default=[],
+        metavar="NAME=PATH[@HxW]",
+        help=(
+            "Serve mode: extra model selectable with ?model=NAME (repeatable; --onnx is served as its file stem). "
+            "All models are kept warm in a session pool bounded by --pool-budget-mb."
+        ),
+    )
+    parser.add_argument(
+        "--pool-budget-mb",
+        type=float,
+        default=1024.0,
+        help="Serve mode with --model: memory budget of loaded models; least recently used ones are unloaded.",
+    )
+    parser.add_argument(
+        "--serve-queue", type=int, default=256, help="Serve mode: pending requests before new ones get HTTP 503."
+    )
+    parser.add_argument(
+        "--recursive",
+        action="store_true",
+        help="Image mode / --bench-source: include images in subdirectories (image-mode outputs mirror the tree).",
+    )
+    parser.add_argument(
+        "--index",
+        type=str,
+        default=None,
+        help=(
+            "Image mode: SQLite index of processed files (path, size, mtime, model). Only new or changed files "
+            "are run, --stream / --manifest are appended to, and an interrupted run resumes where it stopped."
+        ),
+    )
+    parser.add_argument(
+        "--cache-max-mb", type=float, default=1024.0, help="Size bound of --cache; least recently used entries are evicted."
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Keep an existing --stream / video log and skip what it already covers (otherwise it is overwritten).",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Enable onnxruntime profiling plus Python stage spans and merge them into one Chrome-trace / "
+        "Perfetto JSON (open in chrome://tracing or ui.perfetto.dev).",
+    )
+    parser.add_argument(
+        "--profile-out",
+        type=str,
+        default=None,
+        help="Merged trace path for --profile (default: <output>/profile_trace.json).",
+    )
+    parser.add_argument(
+        "--bench-source",
+        type=str,
+        default=None,
+        help="Benchmark mode: directory of frames or a frame_store.py store to cycle through (default: seeded synthetic frames).",
+    )
+    parser.add_argument(
+        "--bench-resolution", type=str, default="480x640", help="Benchmark mode: synthetic frame size HxW."
+    )
+    parser.add_argument("--bench-frames", type=int, default=16, help="Benchmark mode: distinct frames to cycle through.")
+    parser.add_argument("--bench-warmup", type=int, default=20, help="Benchmark mode: untimed warm-up iterations.")
+    parser.add_argument("--bench-iters", type=int, default=200, help="Benchmark mode: timed iterations.")
+    parser.add_argument(
+        "--bench-json",
+        type=str,
+        default=None,
+        help="Benchmark mode: JSON report path (default: <output>/benchmark.json).",
+    )
+    parser.add_argument(
+        "--bench-variant",
+        type=str,
+        default=None,
+        help="Benchmark mode: variant label stored in the record (default: model file stem).",
+    )
+    parser.add_argument(
+        "--bench-history",
+        type=str,
+        default=None,
+        help="Benchmark mode: directory that keeps every run as a versioned JSON record.",
+    )
+    parser.add_argument(
+        "--bench-baseline",
+        type=str,
+        default=None,
+        help="Benchmark mode: record to gate against, or 'latest' for the newest matching record in "
+        "--bench-history; exits non-zero on regression.",
+    )
+    parser.add_argument(
+        "--max-latency-regress",
+        type=float,
+        default=10.0,
+        help="Regression gate: allowed per-stage latency increase in percent.",
+    )
+    parser.add_argument(
+        "--max-fps-drop", type=float, default=10.0, help="Regression gate: allowed per-stage FPS drop in percent."
+    )
+    parser.add_argument(
+        "--gate-percentile",
+        choices=("p50", "p95", "p99", "mean"),
+        default="p95",
+        help="Regression gate: latency statistic compared per stage.",
+    )
+    parser.add_argument("--stride", type=int, default=1, help="Video mode: process every K-th frame.")
+    parser.add_argument("--start", type=float, default=0.0, help="Video mode: start time in seconds (seeks first).")
+    parser.add_argument("--end", type=float, default=None, help="Video mode: stop before this time in seconds.")
+    parser.add_argument(
+        "--latency-log",
+        type=str,
+        default=None,
+        help="Camera mode: per-frame stage timestamps/latencies to a .csv or .jsonl file.",
+    )
+    parser.add_argument(
+        "--latency-window",
+        type=int,
+        default=300,
+        help="Camera mode: number of recent frames used for the rolling p50/p95/p99.",
+    )
+    parser.add_argument("--intra-op-threads", type=int, default=None, help="ORT intra-op threads (default: ORT decides).")
+    parser.add_argument("--inter-op-threads", type=int, default=None, help="ORT inter-op threads (parallel mode only).")
+    parser.add_argument(
+        "--execution-mode",
+        choices=sorted(_EXECUTION_MODES),
+        default="sequential",
+        help="ORT execution mode.",
+    )
+    parser.add_argument(
+        "--graph-opt-level",
+        choices=list(_GRAPH_OPT_LEVELS),
+        default="all",
+        help="ORT graph optimization level.",
+    )
+    parser.add_argument("--no-mem-pattern", action="store_true", help="Disable ORT memory pattern planning.")
+    parser.add_argument("--no-cpu-mem-arena", action="store_true", help="Disable the ORT CPU memory arena.")
+    parser.add_argument(
+        "--optimized-cache",
+        type=str,
+        default=None,
+        help="Directory to save the optimized graph to and load it from on later runs.",
+    )
+    parser.add_argument(
+        "--optimized-format",
+        choices=["ort", "onnx"],
+        default="ort",
+        help="Serialization format for --optimized-cache.",
+    )
+    parser.add_argument(
+        "--dense-decode",
+        action="store_true",
+        help="Decode every anchor cell (reference path) instead of the threshold-first sparse decoder.",
+    )
+    parser.add_argument(
+        "--no-meta-cache",
+        action="store_true",
+        help="Always probe the model instead of using/writing the '<model>.uhdmeta.json' metadata sidecar.",
+    )
     parser.add_argument(
         "--actual-size",
         action="store_true",
@@ -516,25 +3059,252 @@ def build_args():
     return parser
 
 
+def _benchmark_mode(
+    args,
+    session: ort.InferenceSession,
+    session_info: dict,
+    img_size: Tuple[int, int],
+    session_kwargs: dict,
+    nms_params: Optional[dict],
+    fallback: FallbackPolicy,
+) -> None:
+    """--benchmark: run, report, optionally store in --bench-history and gate against --bench-baseline."""
+    frames = load_benchmark_frames(
+        Path(args.bench_source) if args.bench_source else None,
+        args.bench_frames,
+        parse_size(args.bench_resolution),
+        recursive=args.recursive,
+    )
+    samples = run_benchmark(
+        session,
+        session_info,
+        img_size,
+        args.conf_thresh,
+        frames,
+        iters=args.bench_iters,
+        warmup=args.bench_warmup,
+        batch_size=args.batch_size,
+        actual_size=args.actual_size,
+        nms_params=nms_params,
+        fallback=fallback,
+    )
+    batch_size = BoundRunner.effective_batch(session_info, args.batch_size)
+    report = {
+        "schema": BENCH_RECORD_SCHEMA,
+        "model": str(args.onnx),
+        "model_sha256": session_info.get("model_sha256") or model_hash(args.onnx),
+        "variant": args.bench_variant or Path(args.onnx).stem,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": benchmark_host(),
+        "threads": {
+            "intra_op": args.intra_op_threads,
+            "inter_op": args.inter_op_threads,
+            "execution_mode": args.execution_mode,
+        },
+        "img_size": list(img_size),
+        "batch_size": batch_size,
+        "iters": args.bench_iters,
+        "warmup": args.bench_warmup,
+        "source": args.bench_source or f"synthetic {args.bench_resolution} x{len(frames)}",
+        "conf_thresh": args.conf_thresh,
+        "session": {k: (str(v) if isinstance(v, Path) else v) for k, v in session_kwargs.items()},
+        "stages": summarize_benchmark(samples, batch_size),
+    }
+    print("=" * 70)
+    print(f"Benchmark: {Path(args.onnx).name} {img_size[0]}x{img_size[1]} batch {batch_size}, {args.bench_iters} iters")
+    print("=" * 70)
+    for line in benchmark_lines(report["stages"]):
+        print(line)
+    json_path = Path(args.bench_json) if args.bench_json else Path(args.output) / "benchmark.json"
+    json_path.parent.mkdir(parents=True, exist_ok=True)
+    json_path.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(f"Wrote benchmark report to {json_path}")
+    record_path = None
+    if args.bench_history:
+        record_path = save_benchmark_record(report, Path(args.bench_history))
+        print(f"Stored benchmark record {record_path}")
+    if not args.bench_baseline:
+        return
+    if args.bench_baseline == "latest":
+        if not args.bench_history:
+            raise SystemExit("--bench-baseline latest needs --bench-history")
+        baseline_path = find_baseline(Path(args.bench_history), report, exclude=record_path)
+    else:
+        baseline_path = Path(args.bench_baseline)
+    if baseline_path is None:
+        print("[WARN] No matching baseline in the benchmark history; skipping the regression gate.")
+        return
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    lines, ok = compare_benchmarks(report, baseline, args.max_latency_regress, args.max_fps_drop, args.gate_percentile)
+    print(f"Compared against {baseline_path}")
+    for line in lines:
+        print(line)
+    if not ok:
+        raise SystemExit(f"[FAIL] Benchmark regression beyond thresholds (baseline {baseline_path})")
+
+
 def main():
     args = build_args().parse_args()
     img_size = parse_size(args.img_size)
-    session, session_info = load_session(args.onnx, img_size)
-
-    if args.images:
-        run_images(
-            session,
-            session_info,
-            Path(args.images),
-            Path(args.output),
-            img_size,
-            args.conf_thresh,
-            args.actual_size,
-        )
+    session_kwargs = {
+        "use_meta_cache": not args.no_meta_cache,
+        "intra_op_threads": args.intra_op_threads,
+        "inter_op_threads": args.inter_op_threads,
+        "execution_mode": args.execution_mode,
+        "graph_opt_level": args.graph_opt_level,
+        "enable_mem_pattern": not args.no_mem_pattern,
+        "enable_cpu_mem_arena": not args.no_cpu_mem_arena,
+        "optimized_cache_dir": Path(args.optimized_cache) if args.optimized_cache else None,
+        "optimized_format": args.optimized_format,
+        "sparse_decode": not args.dense_decode,
+    }
+    nms_params = None
+    if args.nms:
+        nms_params = {"iou_thresh": args.nms_iou, "class_aware": not args.nms_class_agnostic, "max_det": args.max_det}
+    fallback = FallbackPolicy(args.fallback, args.fallback_thresh, args.fallback_k)
+    trace_path = None
+    if args.profile:
+        trace_path = Path(args.profile_out) if args.profile_out else Path(args.output) / "profile_trace.json"
+        start_profile_trace()
+    if args.images and args.workers > 1 and not is_frame_store(args.images):
+        # Each worker process loads its own session.
+        session, session_info = None, None
+        if trace_path is not None:
+            print("[WARN] --profile only traces the parent process with --workers > 1 (no ORT operator events).")
+    elif args.serve and args.model:
+        # The session pool loads (and may evict) every served model, including --onnx.
+        session, session_info = None, None
     else:
-        record_path = Path(args.record) if args.record else None
-        run_camera(session, session_info, int(args.camera), img_size, args.conf_thresh, record_path, args.actual_size)
+        profile_prefix = str(trace_path.with_suffix("")) + "_ort" if trace_path is not None else None
+        session, session_info = load_session(args.onnx, img_size, **session_kwargs, profile_prefix=profile_prefix)
+
+    try:
+        stream_path = Path(args.stream) if args.stream else None
+        if args.images:
+            if args.no_render and stream_path is None and not args.manifest:
+                stream_path = Path(args.output) / "detections.jsonl"
+            cache = index = None
+            if args.cache or args.index:
+                digest = (session_info or {}).get("model_sha256") or model_hash(args.onnx)
+            if args.cache:
+                namespace = f"{digest}|{img_size[0]}x{img_size[1]}|reduced={int(args.reduced_decode)}"
+                cache = PredictionCache(Path(args.cache), namespace, int(args.cache_max_mb * (1 << 20)))
+            if args.index:
+                index = ImageIndex(Path(args.index), f"{digest}|{img_size[0]}x{img_size[1]}")
+            run_images(
+                session,
+                session_info,
+                Path(args.images),
+                Path(args.output),
+                img_size,
+                args.conf_thresh,
+                args.actual_size,
+                args.batch_size,
+                args.read_workers,
+                args.write_workers,
+                args.queue_depth,
+                workers=args.workers,
+                onnx_path=args.onnx,
+                manifest_path=Path(args.manifest) if args.manifest else None,
+                session_kwargs=session_kwargs,
+                reduced_decode=args.reduced_decode,
+                nms_params=nms_params,
+                fallback=fallback,
+                render=not args.no_render,
+                stream_path=stream_path,
+                stream_flush=args.stream_flush,
+                resume=args.resume,
+                cache=cache,
+                recursive=args.recursive,
+                index=index,
+            )
+            if cache is not None:
+                cache.close()
+            if index is not None:
+                index.close()
+        elif args.benchmark:
+            _benchmark_mode(args, session, session_info, img_size, session_kwargs, nms_params, fallback)
+        elif args.video:
+            video_path = Path(args.video)
+            log_path = stream_path or (Path(args.manifest) if args.manifest else Path(args.output) / f"{video_path.stem}.jsonl")
+            run_video(
+                session,
+                session_info,
+                video_path,
+                img_size,
+                args.conf_thresh,
+                log_path,
+                args.actual_size,
+                batch_size=args.batch_size,
+                stride=args.stride,
+                start_sec=args.start,
+                end_sec=args.end,
+                queue_depth=args.queue_depth,
+                nms_params=nms_params,
+                fallback=fallback,
+                stream_flush=args.stream_flush,
+                resume=args.resume,
+            )
+        elif args.serve:
+            from serve import run_server
+            from session_pool import SessionPool
+
+            pool, default_model = None, Path(args.onnx).stem
+            if args.model:
+                pool = SessionPool(
+                    int(args.pool_budget_mb * (1 << 20)), session_kwargs, warm_batch=args.serve_max_batch
+                )
+                pool.register(default_model, args.onnx, img_size)
+                for spec in args.model:
+                    name, path, size = parse_model_spec(spec, img_size)
+                    pool.register(name, path, size)
+                pool.preload()
+            run_server(
+                session,
+                session_info,
+                img_size,
+                args.conf_thresh,
+                host=args.serve_host,
+                port=args.serve_port,
+                socket_path=Path(args.serve_socket) if args.serve_socket else None,
+                max_batch=args.serve_max_batch,
+                max_delay_ms=args.serve_max_delay_ms,
+                max_queue=args.serve_queue,
+                actual_size=args.actual_size,
+                nms_params=nms_params,
+                fallback=fallback,
+                pool=pool,
+                default_model=default_model,
+            )
+        else:
+            if args.no_render and stream_path is None:
+                stream_path = Path(args.output) / "detections.jsonl"
+            record_path = Path(args.record) if args.record else None
+            run_camera(
+                session,
+                session_info,
+                int(args.camera),
+                img_size,
+                args.conf_thresh,
+                record_path,
+                args.actual_size,
+                latency_log=Path(args.latency_log) if args.latency_log else None,
+                latency_window=args.latency_window,
+                nms_params=nms_params,
+                fallback=fallback,
+                render=not args.no_render,
+                stream_path=stream_path,
+                stream_flush=args.stream_flush,
+                resume=args.resume,
+            )
+
+    finally:
+        if trace_path is not None:
+            write_profile_trace(trace_path, session)
 
 
 if __name__ == "__main__":
+    # serve.py and session_pool.py import this script as `demo`; let them share this instance
+    # (and its profiler state) instead of loading a second copy
+    sys.modules.setdefault("demo", sys.modules[__name__])
     main()
\ No newline at end of file
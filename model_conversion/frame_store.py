@@ -0,0 +1,229 @@
+"""
+Memory-mapped store of preprocessed (resized) frames for repeated evaluation and calibration.
+
+A store is a directory holding
+  frames.u8   raw uint8 [N, H, W, 3] RGB frames, already resized to the model input size
+  index.json  shape/format metadata plus per-frame columns: source, frame, orig_hw, time
+
+Reading only maps the file, so slicing `store.frames[a:b]` is zero-copy and a sweep over the store is
+bound by inference rather than JPEG decode. The reader needs numpy only; packing (the CLI) uses OpenCV
+and the decode helpers from demo.py.
+
+Usage:
+  python frame_store.py --source images_dir --output stores/val64 --img-size 64x64
+  python frame_store.py --source clip.mp4 --output stores/clip64 --stride 5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from image_index import scan_images
+
+STORE_VERSION = 1
+FRAMES_FILE = "frames.u8"
+INDEX_FILE = "index.json"
+
+
+def is_frame_store(path: Union[str, Path]) -> bool:
+    path = Path(path)
+    return path.is_dir() and (path / INDEX_FILE).is_file() and (path / FRAMES_FILE).is_file()
+
+
+def frames_to_input(frames: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    uint8 RGB [N, H, W, 3] (or [H, W, 3]) -> float32 [N, 3, H, W] in [0, 1], written into `out` if given.
+    Same arithmetic as demo.preprocess_into, so store-fed inputs are bit-identical to decoding the source.
+    """
+    if frames.ndim == 3:
+        frames = frames[np.newaxis]
+    if out is None:
+        out = np.empty((frames.shape[0], 3, frames.shape[1], frames.shape[2]), dtype=np.float32)
+    for c in range(3):
+        np.divide(frames[..., c], np.float32(255.0), out=out[:, c], dtype=np.float32)
+    return out
+
+
+class FrameStore:
+    """Read-only view of a packed store; `frames` is a np.memmap, so slices never copy."""
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        index = json.loads((self.path / INDEX_FILE).read_text(encoding="utf-8"))
+        if index.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported frame store version {index.get('version')} in {self.path}")
+        self.img_size: Tuple[int, int] = tuple(index["img_size"])
+        self.channels = index.get("channels", "RGB")
+        n = int(index["count"])
+        h, w = self.img_size
+        if n:
+            self.frames = np.memmap(self.path / FRAMES_FILE, dtype=np.uint8, mode="r", shape=(n, h, w, 3))
+        else:
+            # mmap cannot map an empty file
+            self.frames = np.zeros((0, h, w, 3), dtype=np.uint8)
+        self.sources: List[str] = index["source"]
+        self.frame_numbers = np.asarray(index["frame"], dtype=np.int64)
+        self.orig_hw = np.asarray(index["orig_hw"], dtype=np.int64).reshape(n, 2)
+        self.times = np.asarray(index["time"], dtype=np.float64)
+
+    def __len__(self) -> int:
+        return self.frames.shape[0]
+
+    def label(self, i: int) -> str:
+        """Stable per-frame key: the source path, plus '#<frame>' for video frames."""
+        frame = int(self.frame_numbers[i])
+        return self.sources[i] if frame < 0 else f"{self.sources[i]}#{frame}"
+
+    def output_name(self, i: int) -> str:
+        """File name for an annotated copy of frame i."""
+        src = Path(self.sources[i])
+        frame = int(self.frame_numbers[i])
+        return src.name if frame < 0 else f"{src.stem}_f{frame:06d}.jpg"
+
+    def model_input(self, index: Union[slice, np.ndarray, List[int]], out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Float32 NCHW model input for a slice (zero-copy read) or index array of frames."""
+        return frames_to_input(self.frames[index], out)
+
+
+def _write_index(out_dir: Path, img_size: Tuple[int, int], columns: dict, source: str) -> None:
+    index = {
+        "version": STORE_VERSION,
+        "img_size": list(img_size),
+        "channels": "RGB",
+        "dtype": "uint8",
+        "count": len(columns["source"]),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "packed_from": source,
+        **columns,
+    }
+    tmp = out_dir / (INDEX_FILE + ".tmp")
+    tmp.write_text(json.dumps(index), encoding="utf-8")
+    # the index is written last, so a store without one is an interrupted pack
+    os.replace(tmp, out_dir / INDEX_FILE)
+
+
+def _resize_rgb(img_bgr: np.ndarray, img_size: Tuple[int, int]) -> np.ndarray:
+    import cv2
+
+    h, w = img_size
+    resized = cv2.resize(img_bgr, (w, h), interpolation=cv2.INTER_LINEAR)
+    return np.ascontiguousarray(resized[:, :, ::-1])
+
+
+def pack_images(
+    images: Iterable[Path],
+    out_dir: Path,
+    img_size: Tuple[int, int],
+    reduced_decode: bool = False,
+    read_workers: int = 4,
+) -> int:
+    """Decode, resize and append every readable image (in the given order); returns the frame count."""
+    from demo import imread_for_model
+
+    def _load(p: Path):
+        img, orig_hw = imread_for_model(p, img_size, reduced_decode)
+        if img is None:
+            return p, None, None
+        return p, _resize_rgb(img, img_size), orig_hw
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    columns = {"source": [], "frame": [], "orig_hw": [], "time": []}
+    with open(out_dir / FRAMES_FILE, "wb") as fh, ThreadPoolExecutor(max_workers=max(1, int(read_workers))) as pool:
+        for p, rgb, orig_hw in pool.map(_load, images):
+            if rgb is None:
+                print(f"Skip unreadable file: {p}")
+                continue
+            fh.write(rgb.tobytes())
+            columns["source"].append(str(p))
+            columns["frame"].append(-1)
+            columns["orig_hw"].append([int(orig_hw[0]), int(orig_hw[1])])
+            columns["time"].append(p.stat().st_mtime)
+    _write_index(out_dir, img_size, columns, "images")
+    return len(columns["source"])
+
+
+def pack_video(
+    video_path: Path,
+    out_dir: Path,
+    img_size: Tuple[int, int],
+    stride: int = 1,
+    limit: Optional[int] = None,
+) -> int:
+    """Append every stride-th frame of a video (time = position in seconds); returns the frame count."""
+    import cv2
+
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise RuntimeError(f"Failed to open video {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    if fps <= 0:
+        fps = 30.0
+    stride = max(1, int(stride))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    columns = {"source": [], "frame": [], "orig_hw": [], "time": []}
+    frame_idx = 0
+    try:
+        with open(out_dir / FRAMES_FILE, "wb") as fh:
+            while limit is None or len(columns["source"]) < limit:
+                if frame_idx % stride == 0:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    fh.write(_resize_rgb(frame, img_size).tobytes())
+                    columns["source"].append(str(video_path))
+                    columns["frame"].append(frame_idx)
+                    columns["orig_hw"].append([frame.shape[0], frame.shape[1]])
+                    columns["time"].append(round(frame_idx / fps, 6))
+                elif not cap.grab():
+                    break
+                frame_idx += 1
+    finally:
+        cap.release()
+    _write_index(out_dir, img_size, columns, "video")
+    return len(columns["source"])
+
+
+def build_args():
+    parser = argparse.ArgumentParser(description="Pack images or a video into a memory-mapped frame store.")
+    parser.add_argument("--source", required=True, type=str, help="Image directory or video file.")
+    parser.add_argument("--output", required=True, type=str, help="Store directory to create.")
+    parser.add_argument("--img-size", type=str, default="64x64", help="Stored frame size HxW (the model input size).")
+    parser.add_argument("--stride", type=int, default=1, help="Video: keep every K-th frame.")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of frames to pack.")
+    parser.add_argument("--read-workers", type=int, default=4, help="Images: decode threads.")
+    parser.add_argument("--recursive", action="store_true", help="Images: include images in subdirectories.")
+    parser.add_argument(
+        "--reduced-decode",
+        action="store_true",
+        help="Images: decode JPEGs at reduced scale (faster, no longer bit-identical to full decode).",
+    )
+    return parser
+
+
+def main() -> int:
+    from demo import parse_size
+
+    args = build_args().parse_args()
+    img_size = parse_size(args.img_size)
+    source, out_dir = Path(args.source), Path(args.output)
+    t0 = time.perf_counter()
+    if source.is_dir():
+        # same file selection and order as demo.py image mode
+        images = list(islice(scan_images(source, args.recursive), args.limit))
+        count = pack_images(images, out_dir, img_size, args.reduced_decode, args.read_workers)
+    else:
+        count = pack_video(source, out_dir, img_size, args.stride, args.limit)
+    size_mb = (out_dir / FRAMES_FILE).stat().st_size / (1024 * 1024)
+    print(f"Packed {count} frames ({size_mb:.1f} MB) into {out_dir} in {time.perf_counter() - t0:.2f}s")
+    return 0 if count else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Image discovery and the persistent change index behind demo.py image mode (--recursive, --index).
+"""
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp"}
+
+
+def scan_image_entries(root: Path, recursive: bool = False) -> Iterator[os.DirEntry]:
+    """scan_images as os.DirEntry objects, whose cached stat() callers can reuse."""
+    with os.scandir(root) as it:
+        entries = sorted(it, key=lambda e: e.name)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            if recursive:
+                try:
+                    yield from scan_image_entries(Path(entry.path), True)
+                except OSError as exc:
+                    print(f"[WARN] Skipping unreadable directory {entry.path}: {exc}")
+        elif os.path.splitext(entry.name)[1].lower() in IMAGE_EXTS and entry.is_file():
+            yield entry
+
+
+def scan_images(root: Path, recursive: bool = False) -> Iterator[Path]:
+    """Image files under root in name order, depth-first with recursive (symlinked directories are not followed)."""
+    for entry in scan_image_entries(root, recursive):
+        yield Path(entry.path)
+
+
+class ImageIndex:
+    """
+    Persistent (SQLite) record of processed files by path, size, mtime and model. pending() yields only
+    new or changed files, mark_done() queues a result and commit() makes it durable; outputs registered
+    with track_outputs() are cut back to their size at the last commit when the next run starts.
+    """
+
+    def __init__(self, path: Path, model: str) -> None:
+        self.path = Path(path)
+        self.model = model
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30.0, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS files "
+                "(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, model TEXT, frame INTEGER, processed REAL)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS outputs (path TEXT PRIMARY KEY, size INTEGER)")
+            last = self._conn.execute("SELECT MAX(frame) FROM files").fetchone()[0]
+        self.next_frame = 0 if last is None else int(last) + 1
+        self.skipped = 0
+        self.committed = 0
+        self._inflight = {}
+        self._done: List[tuple] = []
+        self._outputs: List[str] = []
+
+    def track_outputs(self, paths: Iterable[Optional[Path]]) -> None:
+        """Register append-mode outputs (stream, manifest) before opening them, cutting each back to its last commit."""
+        rows = []
+        for p in paths:
+            if p is None:
+                continue
+            key = str(Path(p).resolve())
+            size = os.path.getsize(p) if os.path.exists(p) else 0
+            with self._lock:
+                row = self._conn.execute("SELECT size FROM outputs WHERE path = ?", (key,)).fetchone()
+            if row is not None and size > row[0]:
+                print(f"[WARN] Dropping {size - row[0]} bytes written to {p} after the last index commit")
+                with open(p, "r+b") as fh:
+                    fh.truncate(row[0])
+                size = row[0]
+            self._outputs.append(key)
+            rows.append((key, size))
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO outputs VALUES (?, ?)", rows)
+
+    def pending(self, entries: Iterable[os.DirEntry]) -> Iterator[Path]:
+        """Paths of scan_image_entries() entries needing (re)processing; may run on another thread than mark_done."""
+        for entry in entries:
+            p = Path(entry.path)
+            try:
+                # reuses the stat scandir already made, if it needed one to tell files from directories
+                st = entry.stat()
+            except OSError:
+                continue
+            with self._lock:
+                row = self._conn.execute("SELECT size, mtime_ns, model FROM files WHERE path = ?", (str(p),)).fetchone()
+            if row == (st.st_size, st.st_mtime_ns, self.model):
+                self.skipped += 1
+                continue
+            self._inflight[str(p)] = (st.st_size, st.st_mtime_ns)
+            yield p
+
+    def mark_done(self, path: Path, frame: Optional[int] = None) -> None:
+        size, mtime_ns = self._inflight.pop(str(path))
+        self._done.append((str(path), size, mtime_ns, self.model, frame, time.time()))
+
+    @property
+    def uncommitted(self) -> int:
+        return len(self._done)
+
+    def commit(self) -> None:
+        """Make queued results durable; tracked outputs must already be flushed up to them."""
+        if not self._done:
+            return
+        sizes = [(os.path.getsize(p) if os.path.exists(p) else 0, p) for p in self._outputs]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)", self._done)
+            self._conn.executemany("UPDATE outputs SET size = ? WHERE path = ?", sizes)
+        self.committed += len(self._done)
+        self._done = []
+
+    def close(self) -> None:
+        self.commit()
+        self._conn.close()
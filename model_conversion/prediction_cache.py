@@ -0,0 +1,153 @@
+"""
+Content-addressed on-disk cache of raw model outputs for demo.py image mode (--cache). Needs numpy only.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+PREDICTION_CACHE_VERSION = 1
+
+
+class PredictionCache:
+    """
+    SQLite cache of undecoded per-image session outputs, keyed by SHA-256 of the image bytes within a
+    namespace (model hash, input size, decode mode), so thresholds, fallback, NMS and output format can
+    change between runs and still hit. LRU-bounded by max_bytes; shareable across threads and processes.
+    """
+
+    def __init__(self, path: Path, namespace: str, max_bytes: int = 1 << 30) -> None:
+        self.path = Path(path)
+        self.namespace = f"v{PREDICTION_CACHE_VERSION}|{namespace}"
+        self.max_bytes = int(max_bytes)
+        self._open()
+        self._baseline = self.counters()
+
+    def _open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30.0, check_same_thread=False)
+        self._hits = self._misses = 0
+        self._touched: List[Tuple[float, str]] = []
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries "
+                "(key TEXT PRIMARY KEY, orig_h INTEGER, orig_w INTEGER, nbytes INTEGER, last_used REAL, data BLOB)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_used)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO stats VALUES (?, 0)", [(n,) for n in ("hits", "misses", "evictions", "bytes")]
+            )
+            # the bound may have been lowered since the last run
+            self._evict_locked(0)
+
+    def __getstate__(self) -> dict:
+        return {"path": self.path, "namespace": self.namespace, "max_bytes": self.max_bytes, "_baseline": self._baseline}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._open()
+
+    def key_for(self, data: bytes) -> str:
+        """Cache key of an image file's content."""
+        h = hashlib.sha256(self.namespace.encode("utf-8"))
+        h.update(data)
+        return h.hexdigest()
+
+    def get(self, key: str, nbytes: Optional[int] = None) -> Optional[Tuple[Tuple[int, int], bytes]]:
+        """((orig_h, orig_w), packed outputs) or None; entries of the wrong size count as misses."""
+        with self._lock:
+            row = self._conn.execute("SELECT orig_h, orig_w, data FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or (nbytes is not None and len(row[2]) != nbytes):
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._touched.append((time.time(), key))
+        return (row[0], row[1]), row[2]
+
+    def put_many(self, items: List[Tuple[str, Tuple[int, int], bytes]]) -> None:
+        """Store (key, orig_hw, packed outputs) entries, then evict least recently used ones over max_bytes."""
+        now = time.time()
+        with self._lock, self._conn:
+            added = 0
+            for key, (h, w), data in items:
+                cur = self._conn.execute(
+                    "INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?, ?, ?)", (key, int(h), int(w), len(data), now, data)
+                )
+                added += len(data) if cur.rowcount else 0
+            self._flush_locked()
+            self._evict_locked(added)
+
+    def _evict_locked(self, added: int) -> None:
+        total = self._conn.execute("SELECT value FROM stats WHERE name = 'bytes'").fetchone()[0] + added
+        evicted = 0
+        while total > self.max_bytes:
+            rows = self._conn.execute("SELECT key, nbytes FROM entries ORDER BY last_used LIMIT 256").fetchall()
+            if not rows:
+                total = 0
+                break
+            doomed = []
+            for key, nbytes in rows:
+                if total <= self.max_bytes:
+                    break
+                doomed.append((key,))
+                total -= nbytes
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+            evicted += len(doomed)
+        self._conn.execute("UPDATE stats SET value = ? WHERE name = 'bytes'", (total,))
+        self._conn.execute("UPDATE stats SET value = value + ? WHERE name = 'evictions'", (evicted,))
+
+    def _flush_locked(self) -> None:
+        # LRU touches and counters are batched into whichever write transaction comes next
+        self._conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?", self._touched)
+        self._conn.execute("UPDATE stats SET value = value + ? WHERE name = 'hits'", (self._hits,))
+        self._conn.execute("UPDATE stats SET value = value + ? WHERE name = 'misses'", (self._misses,))
+        self._touched, self._hits, self._misses = [], 0, 0
+
+    def flush(self) -> None:
+        with self._lock, self._conn:
+            self._flush_locked()
+
+    def counters(self) -> dict:
+        """Lifetime hits/misses/evictions/bytes plus the current entry count."""
+        with self._lock:
+            stats = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+            stats["entries"] = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return stats
+
+    def summary(self) -> str:
+        """Counters since this instance was created (including pickled copies that have flushed)."""
+        self.flush()
+        now = self.counters()
+        hits = now["hits"] - self._baseline["hits"]
+        misses = now["misses"] - self._baseline["misses"]
+        evicted = now["evictions"] - self._baseline["evictions"]
+        rate = 100.0 * hits / max(1, hits + misses)
+        return (
+            f"{hits} hits, {misses} misses ({rate:.1f}% hit rate), {evicted} evicted; "
+            f"{now['entries']} entries, {now['bytes'] / (1 << 20):.2f} / {self.max_bytes / (1 << 20):.4g} MB"
+        )
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
+
+    @staticmethod
+    def pack(parts: List[np.ndarray]) -> bytes:
+        return b"".join(np.ascontiguousarray(p).tobytes() for p in parts)
+
+    @staticmethod
+    def unpack(data: bytes, layout: List[Tuple[tuple, np.dtype]]) -> List[np.ndarray]:
+        """Inverse of pack for per-image outputs of the given (shape, dtype) layout (read-only views)."""
+        parts, offset = [], 0
+        for shape, dtype in layout:
+            count = int(np.prod(shape))
+            parts.append(np.frombuffer(data, dtype=dtype, count=count, offset=offset).reshape(shape))
+            offset += count * np.dtype(dtype).itemsize
+        return parts
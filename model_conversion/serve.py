@@ -0,0 +1,396 @@
+"""
+Local inference server for demo.py (--serve): dynamic micro-batching of concurrent requests over
+HTTP or a Unix socket, optionally across several models held in a SessionPool.
+
+Endpoints:
+  POST /detect   encoded image, or raw float32 [3, H, W] tensor (Content-Type application/x-uhd-tensor)
+  GET  /health   batching statistics (and pool state)
+"""
+import json
+import queue
+import socketserver
+import stat
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+from demo import BoundRunner, FallbackPolicy, detections_to_rows, parse_size, preprocess_into, select_detections_batch
+from session_pool import SessionPool
+
+# Content types accepted as a raw float32 [3, H, W] model input; anything else is decoded as an image.
+_SERVE_TENSOR_TYPES = {"application/x-uhd-tensor", "application/octet-stream"}
+
+
+class _ServeRequest:
+    __slots__ = ("inp", "orig_hw", "conf", "t_enqueue", "done", "boxes", "report", "error", "batch", "queue_ms")
+
+    def __init__(self, inp: np.ndarray, orig_hw: Tuple[int, int], conf: float) -> None:
+        self.inp = inp
+        self.orig_hw = orig_hw
+        self.conf = conf
+        self.t_enqueue = time.perf_counter()
+        self.done = threading.Event()
+        self.boxes = self.report = self.error = None
+        self.batch = 0
+        self.queue_ms = 0.0
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching for concurrent single-image requests: one scheduler thread owns a
+    BoundRunner and dispatches a batch as soon as max_batch requests are waiting or the oldest has
+    waited max_delay_ms, whichever comes first. Requests may carry their own conf threshold (the batch
+    is decoded at the loosest floor, then each request is selected at its own). detect() is
+    thread-safe; a full queue raises queue.Full so callers can shed load.
+    """
+
+    def __init__(
+        self,
+        session: ort.InferenceSession,
+        session_info: dict,
+        img_size: Tuple[int, int],
+        max_batch: int = 8,
+        max_delay_ms: float = 2.0,
+        max_queue: int = 256,
+        actual_size: bool = False,
+        nms_params: Optional[dict] = None,
+        fallback: Optional[FallbackPolicy] = None,
+    ) -> None:
+        self.runner = BoundRunner(session, session_info, img_size, max_batch)
+        self.img_size = img_size
+        self.max_delay = max(0.0, float(max_delay_ms)) / 1000.0
+        self.actual_size = actual_size
+        self.nms_params = nms_params
+        self.fallback = fallback
+        self._q: "queue.Queue[_ServeRequest]" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._batch_hist = np.zeros(self.runner.batch_size + 1, dtype=np.int64)
+        self._queue_ms: "deque[float]" = deque(maxlen=1000)
+        self._infer_ms: "deque[float]" = deque(maxlen=1000)
+        self.rejected = 0
+        self._thread = threading.Thread(target=self._loop, name="uhd-batcher", daemon=True)
+        self._thread.start()
+
+    def decode_request(self, body: bytes, content_type: str = "", orig_size: Optional[str] = None):
+        """Request body -> (float32 [3, H, W] input, (orig_h, orig_w)); raises ValueError on bad input."""
+        h, w = self.img_size
+        if content_type.split(";")[0].strip().lower() in _SERVE_TENSOR_TYPES:
+            if len(body) != 3 * h * w * 4:
+                raise ValueError(f"raw tensor must be float32 [3, {h}, {w}] ({3 * h * w * 4} bytes), got {len(body)} bytes")
+            orig_hw = parse_size(orig_size) if orig_size else (h, w)
+            return np.frombuffer(body, dtype=np.float32).reshape(3, h, w), orig_hw
+        img_bgr = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img_bgr is None:
+            raise ValueError("request body is neither a decodable image nor a raw tensor")
+        inp = np.empty((3, h, w), dtype=np.float32)
+        preprocess_into(img_bgr, self.img_size, inp)
+        return inp, img_bgr.shape[:2]
+
+    def detect(self, inp: np.ndarray, orig_hw: Tuple[int, int], conf: float, timeout: float = 30.0) -> _ServeRequest:
+        if self._stop.is_set():
+            raise RuntimeError("model was unloaded")
+        req = _ServeRequest(inp, orig_hw, conf)
+        try:
+            self._q.put_nowait(req)
+        except queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            raise
+        if not req.done.wait(timeout):
+            raise TimeoutError(f"no result within {timeout:g}s")
+        if req.error is not None:
+            raise req.error
+        return req
+
+    def _loop(self) -> None:
+        # after close(), requests already queued are still answered
+        while True:
+            try:
+                first = self._q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            batch = [first]
+            deadline = first.t_enqueue + self.max_delay
+            while len(batch) < self.runner.batch_size:
+                wait = deadline - time.perf_counter()
+                try:
+                    # past the deadline, still take whatever is already queued
+                    batch.append(self._q.get(timeout=wait) if wait > 0 else self._q.get_nowait())
+                except queue.Empty:
+                    break
+            self._run(batch)
+
+    def _run(self, batch: List[_ServeRequest]) -> None:
+        t0 = time.perf_counter()
+        try:
+            for j, req in enumerate(batch):
+                self.runner.input[j] = req.inp
+            dets = self.runner.run(len(batch), min(req.conf for req in batch), self.fallback)
+            targets = [self.img_size if self.actual_size else req.orig_hw for req in batch]
+            confs = [req.conf for req in batch]
+            selected = select_detections_batch(dets, targets, confs, self.nms_params, self.fallback)
+            for req, (boxes, report) in zip(batch, selected):
+                req.boxes, req.report = boxes, report
+        except Exception as exc:
+            for req in batch:
+                req.error = exc
+        t1 = time.perf_counter()
+        with self._stats_lock:
+            self._batch_hist[len(batch)] += 1
+            self._infer_ms.append((t1 - t0) * 1000.0)
+            self._queue_ms.extend((t0 - req.t_enqueue) * 1000.0 for req in batch)
+        for req in batch:
+            req.batch = len(batch)
+            req.queue_ms = (t0 - req.t_enqueue) * 1000.0
+            req.done.set()
+
+    def stats(self) -> dict:
+        """Request/batch counts, batch-size histogram and recent queueing / run latencies."""
+        with self._stats_lock:
+            hist = self._batch_hist.copy()
+            queue_ms = np.asarray(self._queue_ms, dtype=np.float64)
+            infer_ms = np.asarray(self._infer_ms, dtype=np.float64)
+            rejected = self.rejected
+        batches = int(hist.sum())
+        requests = int((hist * np.arange(len(hist))).sum())
+        return {
+            "requests": requests,
+            "batches": batches,
+            "rejected": rejected,
+            "mean_batch": round(requests / batches, 3) if batches else 0.0,
+            "batch_hist": {str(n): int(c) for n, c in enumerate(hist) if c},
+            "queue_ms_p50": round(float(np.percentile(queue_ms, 50)), 3) if len(queue_ms) else 0.0,
+            "queue_ms_p95": round(float(np.percentile(queue_ms, 95)), 3) if len(queue_ms) else 0.0,
+            "batch_ms_mean": round(float(infer_ms.mean()), 3) if len(infer_ms) else 0.0,
+        }
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+
+
+class ServeModels:
+    """
+    The server's MicroBatchers by model name: one fixed batcher, or one per model of a SessionPool,
+    created on first use and closed when the pool evicts that model.
+    """
+
+    def __init__(
+        self,
+        default: str,
+        batcher: Optional[MicroBatcher] = None,
+        pool: Optional[SessionPool] = None,
+        batcher_kwargs: Optional[dict] = None,
+    ) -> None:
+        self.default = default
+        self.pool = pool
+        self.batcher_kwargs = dict(batcher_kwargs or {})
+        self._batchers = {default: batcher} if batcher is not None else {}
+        self._lock = threading.Lock()
+        if pool is not None:
+            pool.on_evict = self._drop
+
+    def get(self, name: Optional[str] = None) -> MicroBatcher:
+        """Batcher for a model name (default model if None); KeyError for unknown names."""
+        name = name or self.default
+        if self.pool is None:
+            if name != self.default:
+                raise KeyError(f"Unknown model '{name}'; serving only '{self.default}'")
+            return self._batchers[name]
+        session, session_info = self.pool.get(name)
+        with self._lock:
+            batcher = self._batchers.get(name)
+            if batcher is None or batcher.runner.session is not session:
+                batcher = MicroBatcher(session, session_info, self.pool.models[name][1], **self.batcher_kwargs)
+                self._batchers[name] = batcher
+        return batcher
+
+    def _drop(self, name: str) -> None:
+        with self._lock:
+            batcher = self._batchers.pop(name, None)
+        if batcher is not None:
+            batcher.close()
+
+    def health(self) -> dict:
+        with self._lock:
+            batchers = dict(self._batchers)
+        if self.pool is None:
+            return batchers[self.default].stats()
+        return {"models": {name: b.stats() for name, b in batchers.items()}, "pool": self.pool.stats()}
+
+    def close(self) -> None:
+        with self._lock:
+            batchers, self._batchers = list(self._batchers.values()), {}
+        for batcher in batchers:
+            batcher.close()
+
+
+def make_serve_handler(models: ServeModels, conf_thresh: float):
+    class _Handler(BaseHTTPRequestHandler):
+        # keep-alive, so clients can reuse one connection per worker
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args) -> None:
+            pass
+
+        def _reply(self, code: int, body: bytes, content_type: str, headers: Optional[dict] = None) -> None:
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, str(value))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _json(self, code: int, obj: dict, headers: Optional[dict] = None) -> None:
+            self._reply(code, json.dumps(obj).encode("utf-8"), "application/json", headers)
+
+        def do_GET(self) -> None:
+            if urlsplit(self.path).path == "/health":
+                self._json(200, {"status": "ok", **models.health()})
+            else:
+                self._json(404, {"error": "not found; use POST /detect or GET /health"})
+
+        def do_POST(self) -> None:
+            url = urlsplit(self.path)
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if url.path != "/detect":
+                self._json(404, {"error": "not found; use POST /detect or GET /health"})
+                return
+            params = parse_qs(url.query)
+            fmt = params.get("format", ["json"])[0]
+            try:
+                batcher = models.get(params.get("model", [None])[0])
+            except KeyError as exc:
+                self._json(404, {"error": exc.args[0]})
+                return
+            except Exception as exc:
+                self._json(500, {"error": f"model load failed: {exc}"})
+                return
+            try:
+                conf = float(params.get("conf", [conf_thresh])[0])
+                if fmt not in ("json", "binary"):
+                    raise ValueError(f"format must be json or binary, got {fmt!r}")
+                inp, orig_hw = batcher.decode_request(body, self.headers.get("Content-Type", ""), self.headers.get("X-Orig-Size"))
+            except ValueError as exc:
+                self._json(400, {"error": str(exc)})
+                return
+            try:
+                req = batcher.detect(inp, orig_hw, conf)
+            except queue.Full:
+                self._json(503, {"error": "server busy"}, {"Retry-After": 1})
+                return
+            except TimeoutError as exc:
+                self._json(504, {"error": str(exc)})
+                return
+            except Exception as exc:
+                self._json(500, {"error": f"inference failed: {exc}"})
+                return
+            headers = {"X-Batch-Size": req.batch, "X-Queue-Ms": f"{req.queue_ms:.3f}"}
+            if fmt == "binary":
+                # DETECTION_DTYPE records, little-endian; np.frombuffer(body, DETECTION_DTYPE) on the client
+                headers["X-Detections"] = len(req.boxes)
+                self._reply(200, req.boxes.tobytes(), "application/octet-stream", headers)
+            else:
+                record = {"detections": detections_to_rows(req.boxes), "batch": req.batch, "queue_ms": round(req.queue_ms, 3)}
+                if req.report is not None:
+                    record["fallback"] = req.report
+                self._json(200, record, headers)
+
+    return _Handler
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # BaseHTTPRequestHandler expects an (host, port) client address
+        conn, _ = super().get_request()
+        return conn, ("unix", 0)
+
+
+def run_server(
+    session: Optional[ort.InferenceSession],
+    session_info: Optional[dict],
+    img_size: Tuple[int, int],
+    conf_thresh: float,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    socket_path: Optional[Path] = None,
+    max_batch: int = 8,
+    max_delay_ms: float = 2.0,
+    max_queue: int = 256,
+    actual_size: bool = False,
+    nms_params: Optional[dict] = None,
+    fallback: Optional[FallbackPolicy] = None,
+    pool: Optional[SessionPool] = None,
+    default_model: str = "default",
+) -> None:
+    """
+    Serve POST /detect (an encoded image, or a raw float32 [3, H, W] tensor with Content-Type
+    application/x-uhd-tensor and optional X-Orig-Size: HxW) and GET /health over localhost HTTP or a
+    Unix socket until interrupted. Query parameters: conf=<threshold>, format=json|binary and, with a
+    SessionPool, model=<name> (default_model otherwise). Concurrent requests for a model share its
+    session through a MicroBatcher.
+    """
+    batcher_kwargs = dict(
+        max_batch=max_batch,
+        max_delay_ms=max_delay_ms,
+        max_queue=max_queue,
+        actual_size=actual_size,
+        nms_params=nms_params,
+        fallback=fallback,
+    )
+    if pool is None:
+        models = ServeModels(default_model, batcher=MicroBatcher(session, session_info, img_size, **batcher_kwargs))
+    else:
+        models = ServeModels(default_model, pool=pool, batcher_kwargs=batcher_kwargs)
+        models.get(default_model)
+    handler = make_serve_handler(models, conf_thresh)
+    if socket_path is not None:
+        socket_path = Path(socket_path)
+        if socket_path.exists():
+            if not stat.S_ISSOCK(socket_path.stat().st_mode):
+                raise FileExistsError(f"{socket_path} exists and is not a socket")
+            # left behind by a server that did not shut down cleanly
+            socket_path.unlink()
+        server = UnixHTTPServer(str(socket_path), handler)
+        where = f"unix:{socket_path}"
+    else:
+        server = ThreadingHTTPServer((host, int(port)), handler)
+        server.daemon_threads = True
+        where = f"http://{host}:{server.server_address[1]}"
+    names = f"models {', '.join(sorted(pool.models))} (default {default_model})" if pool is not None else f"model {default_model}"
+    print(
+        f"[INFO] Serving {names} at {where} (POST /detect, GET /health); batches of up to "
+        f"{models.get().runner.batch_size}, max queueing delay {max_delay_ms:g} ms."
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("[INFO] Shutting down.")
+    finally:
+        server.server_close()
+        if socket_path is not None and socket_path.exists():
+            socket_path.unlink()
+        health = models.health()
+        models.close()
+        for name, st in (health["models"].items() if pool is not None else [(default_model, health)]):
+            print(
+                f"[INFO] Served {st['requests']} requests for '{name}' in {st['batches']} batches "
+                f"(mean batch {st['mean_batch']:g}, {st['rejected']} rejected)."
+            )
+        if pool is not None:
+            st = pool.stats()
+            print(f"[INFO] Session pool: {st['loads']} loads, {st['hits']} hits, {st['evictions']} evictions.")
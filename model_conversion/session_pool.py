@@ -0,0 +1,154 @@
+"""
+Warm, memory-bounded pool of onnxruntime sessions for several models (demo.py --serve --model).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import numpy as np
+import onnxruntime as ort
+from onnx import TensorProto, helper
+
+from demo import BoundRunner, load_session, run_and_decode_batch
+
+
+def _rss_bytes() -> Optional[int]:
+    """Resident set size of this process (Linux /proc), or None where unavailable."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class SessionPool:
+    """
+    Warm sessions for several named models within budget_bytes, evicting the least recently used.
+    get(name) returns (session, session_info) like load_session, loading the model and running a dummy
+    batch on first use; on_evict(name) lets owners of per-model state release it. A model is charged
+    the RSS growth of its latest load and warm-up, at least its file size. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        budget_bytes: int,
+        session_kwargs: Optional[dict] = None,
+        warm_batch: int = 1,
+        on_evict: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.budget_bytes = int(budget_bytes)
+        self.session_kwargs = dict(session_kwargs or {})
+        self.warm_batch = max(1, int(warm_batch))
+        self.on_evict = on_evict
+        self.models = {}
+        self._loaded: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.hits = self.loads = self.evictions = 0
+        self._warm_up_runtime()
+
+    def _warm_up_runtime(self) -> None:
+        """Run a one-node session so onnxruntime's one-time process setup is not charged to the first model."""
+        graph = helper.make_graph(
+            [helper.make_node("Identity", ["x"], ["y"])],
+            "warmup",
+            [helper.make_tensor_value_info("x", TensorProto.FLOAT, [1])],
+            [helper.make_tensor_value_info("y", TensorProto.FLOAT, [1])],
+        )
+        # pinned: onnx may default to an IR version newer than the installed onnxruntime reads
+        model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)], ir_version=8)
+        session = ort.InferenceSession(model.SerializeToString(), providers=["CPUExecutionProvider"])
+        session.run(None, {"x": np.zeros(1, dtype=np.float32)})
+
+    def register(self, name: str, onnx_path: str, img_size: Tuple[int, int]) -> None:
+        if not Path(onnx_path).exists():
+            raise FileNotFoundError(f"Model '{name}' not found: {onnx_path}")
+        self.models[name] = (str(onnx_path), tuple(img_size))
+
+    def get(self, name: str) -> Tuple[ort.InferenceSession, dict]:
+        """(session, session_info) for a registered model, loading and warming it if needed."""
+        with self._lock:
+            entry = self._loaded.get(name)
+            if entry is not None:
+                self._loaded.move_to_end(name)
+                self.hits += 1
+                return entry[0], entry[1]
+        if name not in self.models:
+            raise KeyError(f"Unknown model '{name}'; registered: {', '.join(sorted(self.models))}")
+        with self._load_lock:
+            with self._lock:
+                # another thread may have loaded it while we waited
+                entry = self._loaded.get(name)
+                if entry is not None:
+                    self._loaded.move_to_end(name)
+                    self.hits += 1
+                    return entry[0], entry[1]
+            session, session_info, nbytes = self._load(name)
+            with self._lock:
+                self._loaded[name] = (session, session_info, nbytes)
+                self.loads += 1
+                evicted = self._evict_locked(keep=name)
+        for victim in evicted:
+            if self.on_evict is not None:
+                self.on_evict(victim)
+        return session, session_info
+
+    def _load(self, name: str) -> Tuple[ort.InferenceSession, dict, int]:
+        onnx_path, img_size = self.models[name]
+        rss0 = _rss_bytes()
+        t0 = time.perf_counter()
+        session, session_info = load_session(onnx_path, img_size, **self.session_kwargs)
+        batch = BoundRunner.effective_batch(session_info, self.warm_batch)
+        # first run allocates the arena and settles anchors/decoder in session_info
+        run_and_decode_batch(session, session_info, np.zeros((batch, 3, *img_size), dtype=np.float32), None)
+        elapsed = time.perf_counter() - t0
+        rss1 = _rss_bytes()
+        # at least the weights: a reload can reuse memory an evicted session freed and look free
+        nbytes = os.path.getsize(onnx_path)
+        if rss0 is not None and rss1 is not None:
+            nbytes = max(nbytes, rss1 - rss0)
+        print(f"[INFO] Pool loaded '{name}' in {elapsed * 1000:.1f} ms (~{nbytes / (1 << 20):.1f} MB).")
+        return session, session_info, nbytes
+
+    def _evict_locked(self, keep: Optional[str] = None) -> List[str]:
+        evicted = []
+        while self.loaded_bytes() > self.budget_bytes and len(self._loaded) > (1 if keep in self._loaded else 0):
+            victim = next(n for n in self._loaded if n != keep)
+            del self._loaded[victim]
+            self.evictions += 1
+            evicted.append(victim)
+            print(f"[INFO] Pool evicted '{victim}' (budget {self.budget_bytes / (1 << 20):.4g} MB).")
+        return evicted
+
+    def preload(self, names: Optional[Iterable[str]] = None) -> None:
+        for name in self.models if names is None else names:
+            self.get(name)
+
+    def evict(self, name: str) -> bool:
+        with self._lock:
+            found = self._loaded.pop(name, None) is not None
+        if found and self.on_evict is not None:
+            self.on_evict(name)
+        return found
+
+    def loaded(self) -> List[str]:
+        """Loaded model names, least recently used first."""
+        with self._lock:
+            return list(self._loaded)
+
+    def loaded_bytes(self) -> int:
+        return sum(entry[2] for entry in self._loaded.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loaded": list(self._loaded),
+                "loaded_mb": round(self.loaded_bytes() / (1 << 20), 2),
+                "budget_mb": round(self.budget_bytes / (1 << 20), 2),
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }